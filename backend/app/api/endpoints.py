@@ -1,8 +1,14 @@
 import os
+import glob
+import asyncio
+import hashlib
 import time
+import threading
 from datetime import datetime
-from typing import List, Optional
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, BackgroundTasks
+from functools import lru_cache, partial
+from typing import Any, Dict, List, Optional
+from cachetools import LRUCache
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, BackgroundTasks, Request, Response
 from fastapi.responses import JSONResponse
 
 from app.models.schemas import (
@@ -12,30 +18,156 @@ from app.models.schemas import (
 )
 from app.services.ocr_service import OCRService
 from app.services.artist_extraction_service import ArtistExtractionService
-from app.services.firebase_service import firebase_service
+from app.services.firebase_service import get_firebase_service
+from app.services.redis_service import redis_backend
+from app.middleware.rate_limit import enforce_analysis_limit
 from app.utils.file_utils import (
     generate_file_id, is_allowed_file, validate_file_size,
-    get_upload_path, save_upload_file, ensure_upload_directory
+    get_upload_path, save_upload_file,
+    calculate_file_hash, FileTooLargeError, MAX_FILE_SIZE, SIGNATURE_LENGTH
 )
+from app.utils.file_utils import cleanup_old_files as remove_old_uploads
+from app.utils.responses import ORJSONResponse
 import structlog
 
 logger = structlog.get_logger(__name__)
 
 ocr_service = OCRService()
 
+@lru_cache(maxsize=1)
 def get_artist_service():
-    global _artist_service
-    if '_artist_service' not in globals():
-        global _artist_service
-        _artist_service = ArtistExtractionService()
-    return _artist_service
+    return ArtistExtractionService()
 
+@lru_cache(maxsize=1)
 def get_spotify_service():
     from app.services.spotify_service import SpotifyService
     return SpotifyService()
 
+# file_id -> stored path for files uploaded or looked up by this process.
+# Bounded like the result caches; an evicted entry just costs one glob.
+FILE_INDEX: LRUCache = LRUCache(maxsize=4096)
+
+
+def resolve_upload_path(file_id: str, upload_dir: str) -> Optional[str]:
+    """Return the stored path for an uploaded file, or None if it doesn't exist."""
+    file_path = _cache_get(FILE_INDEX, file_id)
+    if file_path:
+        if os.path.exists(file_path):
+            return file_path
+        # Removed by cleanup since it was indexed
+        with _cache_lock:
+            FILE_INDEX.pop(file_id, None)
+
+    # Files are stored as {file_id}{ext}; fall back to a targeted glob for
+    # uploads made before this process started.
+    if not file_id or os.path.basename(file_id) != file_id:
+        return None
+    pattern = os.path.join(upload_dir, f"{glob.escape(file_id)}.*")
+    matches = glob.glob(pattern)
+    if not matches:
+        return None
+
+    _cache_set(FILE_INDEX, file_id, matches[0])
+    return matches[0]
+
+# Results keyed by image content hash, so re-uploads of the same flyer skip
+# the OCR engine / Gemini round-trip entirely.
+_OCR_CACHE: LRUCache = LRUCache(maxsize=512)
+_IMAGE_ANALYSIS_CACHE: LRUCache = LRUCache(maxsize=512)
+# Stored path -> content hash; uploads are never rewritten in place, so each
+# file is read for hashing once rather than on every OCR/analysis request
+_FILE_HASHES: LRUCache = LRUCache(maxsize=1024)
+_cache_lock = threading.Lock()
+
+
+def _cache_get(cache: LRUCache, key: str) -> Optional[Any]:
+    with _cache_lock:
+        return cache.get(key)
+
+
+def _cache_set(cache: LRUCache, key: str, value: Any) -> None:
+    with _cache_lock:
+        cache[key] = value
+
+
+async def _file_hash(file_path: str) -> str:
+    """Content hash of an uploaded file, read off the event loop on first use."""
+    file_hash = _cache_get(_FILE_HASHES, file_path)
+    if file_hash is None:
+        file_hash = await asyncio.to_thread(calculate_file_hash, file_path)
+        _cache_set(_FILE_HASHES, file_path, file_hash)
+    return file_hash
+
+
+# OCR results also go to Redis when configured, so they survive restarts and
+# are shared between instances; the in-process LRU stays in front of it
+OCR_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+
+
+async def _ocr_cache_get(cache_key: str) -> Optional[Dict[str, Any]]:
+    result = _cache_get(_OCR_CACHE, cache_key)
+    if result is not None or not redis_backend.is_available:
+        return result
+    try:
+        result = await redis_backend.get_cached(f"ocr:{cache_key}")
+    except Exception as e:
+        logger.warning("OCR cache lookup failed", error=str(e))
+        return None
+    if result is not None:
+        _cache_set(_OCR_CACHE, cache_key, result)
+    return result
+
+
+async def _ocr_cache_set(cache_key: str, result: Dict[str, Any]) -> None:
+    _cache_set(_OCR_CACHE, cache_key, result)
+    if redis_backend.is_available:
+        try:
+            await redis_backend.set_cached(f"ocr:{cache_key}", result, OCR_CACHE_TTL_SECONDS)
+        except Exception as e:
+            logger.warning("OCR cache store failed", error=str(e))
+
+# Unfiltered extraction results per OCR text. Confidences depend on the whole
+# text (repeat counts, whether the AI pass runs), so the text as a whole is
+# the key: identical text always gets identical results, hit or miss.
+_EXTRACTION_CACHE: LRUCache = LRUCache(maxsize=1024)
+
+
+def _extraction_key(text: str, use_ai: bool) -> str:
+    # Blank lines and surrounding whitespace don't change what is extracted
+    lines = "\n".join(line.strip() for line in text.splitlines() if line.strip())
+    digest = hashlib.blake2b(lines.encode("utf-8"), digest_size=16).hexdigest()
+    return f"{digest}:{int(use_ai)}"
+
+
+async def extract_artists_cached(text: str, use_ai: bool) -> Dict[str, Any]:
+    """
+    Extract artists from OCR text, reusing the result for text seen before.
+    
+    Args:
+        text: Raw OCR text
+        use_ai: Whether to use AI extraction
+        
+    Returns:
+        Dictionary with unfiltered artists (highest confidence first) and method
+    """
+    key = _extraction_key(text, use_ai)
+    result = _cache_get(_EXTRACTION_CACHE, key)
+    if result is None:
+        extracted = await get_artist_service().extract_artists(
+            text=text,
+            use_ai=use_ai,
+            confidence_threshold=0.0
+        )
+        result = {"artists": extracted['artists'], "method": extracted['method']}
+        _cache_set(_EXTRACTION_CACHE, key, result)
+    return result
+
 router = APIRouter()
 
+# Minimum seconds between upload-triggered cleanup scans of the uploads dir
+_CLEANUP_INTERVAL = 300
+_last_cleanup = 0.0
+
 
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
@@ -49,6 +181,7 @@ async def health_check():
 
 @router.post("/upload", response_model=UploadResponse)
 async def upload_file(
+    http_request: Request,
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...)
 ):
@@ -56,29 +189,33 @@ async def upload_file(
         if not file.filename:
             raise HTTPException(status_code=400, detail="No file provided")
 
-        if not file.content_type:
-            raise HTTPException(status_code=400, detail="File content type not specified")
+        # The client's Content-Type is ignored; the bytes decide the type
+        header = await file.read(SIGNATURE_LENGTH)
+        await file.seek(0)
 
-        if not is_allowed_file(file.filename, file.content_type):
+        if not is_allowed_file(file.filename, header):
             raise HTTPException(
                 status_code=400,
                 detail="Invalid file type. Allowed types: JPEG, PNG, TIFF, BMP"
             )
         
-        content = await file.read()
-        file_size = len(content)
+        upload_dir = http_request.app.state.upload_dir
+        file_id = generate_file_id()
+        file_path = get_upload_path(file_id, file.filename, upload_dir=upload_dir)
         
-        if not validate_file_size(file_size):
+        try:
+            bytes_written = await save_upload_file(file, file_path, max_size=MAX_FILE_SIZE)
+        except FileTooLargeError:
             raise HTTPException(
-                status_code=400,
-                detail=f"File too large. Maximum size: {10} MB"
+                status_code=413,
+                detail=f"File too large. Maximum size: {MAX_FILE_SIZE // 1024 // 1024} MB"
             )
         
-        file_id = generate_file_id()
-        file_path = get_upload_path(file_id, file.filename)
+        if not validate_file_size(bytes_written):
+            os.remove(file_path)
+            raise HTTPException(status_code=400, detail="Uploaded file is empty")
         
-        await file.seek(0)
-        bytes_written = await save_upload_file(file, file_path)
+        _cache_set(FILE_INDEX, file_id, file_path)
         
         logger.info(
             "File uploaded successfully",
@@ -87,7 +224,7 @@ async def upload_file(
             size=bytes_written
         )
         
-        background_tasks.add_task(cleanup_old_files)
+        _schedule_cleanup(background_tasks, upload_dir)
         
         return UploadResponse(
             file_id=file_id,
@@ -104,18 +241,12 @@ async def upload_file(
         raise HTTPException(status_code=500, detail="File upload failed")
 
 
-@router.post("/ocr", response_model=OCRResult)
-async def extract_text(request: OCRRequest):
+@router.post("/ocr", response_model=OCRResult, dependencies=[Depends(enforce_analysis_limit)])
+async def extract_text(request: OCRRequest, http_request: Request):
     try:
-        upload_dir = ensure_upload_directory()
-        file_path = None
+        file_path = resolve_upload_path(request.file_id, http_request.app.state.upload_dir)
         
-        for filename in os.listdir(upload_dir):
-            if filename.startswith(request.file_id):
-                file_path = os.path.join(upload_dir, filename)
-                break
-        
-        if not file_path or not os.path.exists(file_path):
+        if not file_path:
             raise HTTPException(status_code=404, detail="File not found")
         
         if not ocr_service.validate_image(file_path):
@@ -123,14 +254,23 @@ async def extract_text(request: OCRRequest):
         
         start_time = time.time()
         
-        original_engine = ocr_service.ocr_engine
-        if request.engine:
-            ocr_service.ocr_engine = request.engine
+        engine = request.engine or ocr_service.ocr_engine
+        cache_key = f"{await _file_hash(file_path)}:{engine}"
+        result = await _ocr_cache_get(cache_key)
         
-        try:
-            result = ocr_service.extract_text(file_path)
-        finally:
-            ocr_service.ocr_engine = original_engine
+        if result is None:
+            state = http_request.app.state
+            if engine == "google_vision":
+                result = await ocr_service.extract_text_google_vision_async(
+                    file_path, executor=state.ocr_pool
+                )
+            else:
+                async with state.ocr_semaphore:
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        state.ocr_pool,
+                        partial(ocr_service.extract_text, file_path, engine=engine)
+                    )
+            await _ocr_cache_set(cache_key, result)
         
         processing_time = time.time() - start_time
         
@@ -162,16 +302,14 @@ async def extract_artists(request: ArtistExtractionRequest):
     try:
         start_time = time.time()
         
-        result = await get_artist_service().extract_artists(
-            text=request.text,
-            use_ai=request.use_ai,
-            confidence_threshold=request.confidence_threshold
-        )
+        result = await extract_artists_cached(request.text, request.use_ai)
         
         processing_time = time.time() - start_time
         
         artists = []
         for artist_data in result['artists']:
+            if artist_data['confidence'] < request.confidence_threshold:
+                continue
             artists.append({
                 "name": artist_data['name'],
                 "confidence": artist_data['confidence'] * 100,
@@ -186,30 +324,26 @@ async def extract_artists(request: ArtistExtractionRequest):
             processing_time=processing_time
         )
         
-        return ArtistExtractionResponse(
-            artists=artists,
-            total_found=len(artists),
-            processing_time=processing_time,
-            method=result['method']
-        )
+        # The payload is built to match ArtistExtractionResponse already;
+        # returning the response directly skips FastAPI's revalidation pass.
+        return ORJSONResponse({
+            "artists": artists,
+            "total_found": len(artists),
+            "processing_time": processing_time,
+            "method": result['method']
+        })
         
     except Exception as e:
         logger.error("Artist extraction failed", error=str(e))
         raise HTTPException(status_code=500, detail="Artist extraction failed")
 
 
-@router.post("/analyze-image", response_model=ArtistExtractionResponse)
-async def analyze_image(request: ImageAnalysisRequest):
+@router.post("/analyze-image", response_model=ArtistExtractionResponse, dependencies=[Depends(enforce_analysis_limit)])
+async def analyze_image(request: ImageAnalysisRequest, http_request: Request, response: Response):
     try:
-        upload_dir = ensure_upload_directory()
-        file_path = None
-
-        for filename in os.listdir(upload_dir):
-            if filename.startswith(request.file_id):
-                file_path = os.path.join(upload_dir, filename)
-                break
+        file_path = resolve_upload_path(request.file_id, http_request.app.state.upload_dir)
 
-        if not file_path or not os.path.exists(file_path):
+        if not file_path:
             raise HTTPException(status_code=404, detail="File not found")
 
         if not ocr_service.validate_image(file_path):
@@ -217,8 +351,20 @@ async def analyze_image(request: ImageAnalysisRequest):
 
         start_time = time.time()
 
-        artist_service = get_artist_service()
-        raw_artists = await artist_service.gemini_service.extract_artists_from_image(file_path)
+        cache_key = await _file_hash(file_path)
+        raw_artists = _cache_get(_IMAGE_ANALYSIS_CACHE, cache_key)
+
+        if raw_artists is None:
+            state = http_request.app.state
+            artist_service = get_artist_service()
+            # The OCR slot covers only the image re-encode, so slow Gemini
+            # responses don't hold up /ocr
+            raw_artists = await artist_service.gemini_service.extract_artists_from_image(
+                file_path, executor=state.ocr_pool, semaphore=state.ocr_semaphore
+            )
+            # Empty results are also how Gemini failures surface, so don't pin them
+            if raw_artists:
+                _cache_set(_IMAGE_ANALYSIS_CACHE, cache_key, raw_artists)
 
         artists = [
             {
@@ -241,12 +387,13 @@ async def analyze_image(request: ImageAnalysisRequest):
             processing_time=processing_time
         )
 
-        return ArtistExtractionResponse(
-            artists=artists,
-            total_found=len(artists),
-            processing_time=processing_time,
-            method="gemini_vision"
-        )
+        # Returned directly, so carry over the rate limit headers ourselves
+        return ORJSONResponse({
+            "artists": artists,
+            "total_found": len(artists),
+            "processing_time": processing_time,
+            "method": "gemini_vision"
+        }, headers=dict(response.headers))
 
     except HTTPException:
         raise
@@ -343,19 +490,21 @@ async def create_playlist(request: PlaylistCreationRequest):
                 'successful_artists': result['successful_artists'],
                 'failed_artists': result['failed_artists']
             }
-            firebase_service.save_playlist(request.user_id, playlist_data)
+            get_firebase_service().save_playlist(request.user_id, playlist_data)
             logger.info("Playlist saved to Firestore", user_id=request.user_id)
         except Exception as e:
             logger.warning("Failed to save playlist to Firestore", error=str(e))
             # Don't fail the request if Firestore save fails
 
-        return PlaylistCreationResponse(
-            playlist=playlist,
-            successful_artists=result['successful_artists'],
-            failed_artists=result['failed_artists'],
-            total_tracks_added=len(tracks),
-            processing_time=processing_time
-        )
+        # Playlists can carry hundreds of tracks; the dict already has the
+        # PlaylistCreationResponse shape, so skip the response_model revalidation.
+        return ORJSONResponse({
+            "playlist": playlist,
+            "successful_artists": result['successful_artists'],
+            "failed_artists": result['failed_artists'],
+            "total_tracks_added": len(tracks),
+            "processing_time": processing_time
+        })
         
     except HTTPException:
         raise
@@ -394,7 +543,7 @@ async def spotify_callback(code: str, state: Optional[str] = None):
                 detail="Spotify service not configured. Please set SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET."
             )
 
-        token_info = spotify_service.exchange_code_for_token(code, state)
+        token_info = await asyncio.to_thread(spotify_service.exchange_code_for_token, code, state)
 
         if not token_info:
             raise HTTPException(
@@ -403,7 +552,7 @@ async def spotify_callback(code: str, state: Optional[str] = None):
             )
 
         access_token = token_info.get('access_token')
-        user_info = spotify_service.get_user_info(access_token)
+        user_info = await asyncio.to_thread(spotify_service.get_user_info, access_token)
 
         if not user_info:
             raise HTTPException(
@@ -429,11 +578,20 @@ async def spotify_callback(code: str, state: Optional[str] = None):
         raise HTTPException(status_code=500, detail="OAuth callback failed")
 
 
-async def cleanup_old_files():
+def _schedule_cleanup(background_tasks: BackgroundTasks, upload_dir: str) -> None:
+    # No await between the check and the update, so concurrent uploads on the
+    # event loop can't both schedule a scan.
+    global _last_cleanup
+    now = time.monotonic()
+    if now - _last_cleanup < _CLEANUP_INTERVAL:
+        return
+    _last_cleanup = now
+    background_tasks.add_task(cleanup_old_files, upload_dir)
+
+
+async def cleanup_old_files(upload_dir: str):
     try:
-        from app.utils.file_utils import cleanup_old_files
-        upload_dir = ensure_upload_directory()
-        deleted_count = cleanup_old_files(upload_dir, max_age_hours=24)
+        deleted_count = remove_old_uploads(upload_dir, max_age_hours=24)
         logger.info("File cleanup completed", deleted_files=deleted_count)
     except Exception as e:
         logger.error("File cleanup failed", error=str(e))
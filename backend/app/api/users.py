@@ -4,6 +4,7 @@ User management API endpoints.
 from typing import List
 from fastapi import APIRouter, HTTPException, Request, Depends, Header
 from fastapi import status
+from pydantic import BaseModel
 import structlog
 
 from app.models.user import (
@@ -14,14 +15,32 @@ from app.models.user import (
     RateLimitInfo,
     PlaylistRecord
 )
-from app.services.firebase_service import firebase_service
-from app.middleware.rate_limit import require_auth
+from app.services.firebase_service import get_firebase_service
+from app.middleware.rate_limit import DAILY_ANALYSIS_LIMIT, require_auth, verify_token_cached
+from app.utils.responses import ORJSONResponse
 
 logger = structlog.get_logger(__name__)
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
+def _model_response(model: BaseModel, status_code: int = status.HTTP_200_OK) -> ORJSONResponse:
+    """
+    Serialize an already-validated model straight to a response.
+    
+    Returning a Response skips FastAPI's second validation pass against the
+    route's response_model, which stays declared for the OpenAPI schema.
+    
+    Args:
+        model: Validated response model
+        status_code: HTTP status code
+        
+    Returns:
+        JSON response
+    """
+    return ORJSONResponse(model.model_dump(mode="json"), status_code=status_code)
+
+
 def get_current_user_id(authorization: str = Header(None)) -> str:
     """
     Dependency to get current user ID from authorization header.
@@ -42,17 +61,17 @@ def get_current_user_id(authorization: str = Header(None)) -> str:
             headers={"WWW-Authenticate": "Bearer"}
         )
     
-    token = authorization.split('Bearer ')[1]
+    token = authorization[7:]  # len('Bearer ')
     
     try:
-        decoded_token = firebase_service.verify_id_token(token)
-        if not decoded_token:
+        uid = verify_token_cached(token)
+        if not uid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authentication token"
             )
         
-        return decoded_token.get('uid')
+        return uid
         
     except Exception as e:
         logger.error("Authentication failed", error=str(e))
@@ -74,7 +93,7 @@ async def create_user(
     """
     try:
         # Check if user already exists
-        existing_user = firebase_service.get_user(user_id)
+        existing_user = get_firebase_service().get_user(user_id)
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_409_CONFLICT,
@@ -83,7 +102,7 @@ async def create_user(
         
         # Create user
         user_dict = user_data.model_dump(exclude_none=True)
-        success = firebase_service.create_or_update_user(user_id, user_dict)
+        success = get_firebase_service().create_or_update_user(user_id, user_dict)
         
         if not success:
             raise HTTPException(
@@ -92,7 +111,7 @@ async def create_user(
             )
         
         # Get created user
-        created_user = firebase_service.get_user(user_id)
+        created_user = get_firebase_service().get_user(user_id)
         if not created_user:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -100,7 +119,7 @@ async def create_user(
             )
         
         created_user['user_id'] = user_id
-        return UserProfile(**created_user)
+        return _model_response(UserProfile(**created_user), status.HTTP_201_CREATED)
         
     except HTTPException:
         raise
@@ -120,15 +139,16 @@ async def get_current_user(user_id: str = Depends(get_current_user_id)):
     Requires authentication.
     """
     try:
-        user_data = firebase_service.get_user(user_id)
+        # Read alongside today's quota so the usage fields are current
+        user_data, _, _ = get_firebase_service().get_user_with_rate_limit(user_id, limit=DAILY_ANALYSIS_LIMIT)
         
         if not user_data:
             # User doesn't exist, create a basic profile
-            firebase_service.create_or_update_user(user_id, {})
-            user_data = firebase_service.get_user(user_id)
+            get_firebase_service().create_or_update_user(user_id, {})
+            user_data, _, _ = get_firebase_service().get_user_with_rate_limit(user_id, limit=DAILY_ANALYSIS_LIMIT)
         
         user_data['user_id'] = user_id
-        return UserProfile(**user_data)
+        return _model_response(UserProfile(**user_data))
         
     except Exception as e:
         logger.error("Failed to get user", user_id=user_id, error=str(e))
@@ -151,7 +171,7 @@ async def update_current_user(
     try:
         # Update user
         update_dict = user_update.model_dump(exclude_none=True)
-        success = firebase_service.create_or_update_user(user_id, update_dict)
+        success = get_firebase_service().create_or_update_user(user_id, update_dict)
         
         if not success:
             raise HTTPException(
@@ -159,8 +179,8 @@ async def update_current_user(
                 detail="Failed to update user"
             )
         
-        # Get updated user
-        updated_user = firebase_service.get_user(user_id)
+        # Get updated user, with today's quota in the usage fields
+        updated_user, _, _ = get_firebase_service().get_user_with_rate_limit(user_id, limit=DAILY_ANALYSIS_LIMIT)
         if not updated_user:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -168,7 +188,7 @@ async def update_current_user(
             )
         
         updated_user['user_id'] = user_id
-        return UserProfile(**updated_user)
+        return _model_response(UserProfile(**updated_user))
         
     except HTTPException:
         raise
@@ -188,30 +208,27 @@ async def get_user_stats(user_id: str = Depends(get_current_user_id)):
     Requires authentication.
     """
     try:
-        user_data = firebase_service.get_user(user_id)
+        user_data, is_allowed, remaining = get_firebase_service().get_user_with_rate_limit(user_id, limit=DAILY_ANALYSIS_LIMIT)
         
         if not user_data:
             # New user
-            return UserStats(
+            return _model_response(UserStats(
                 total_analyses=0,
                 total_playlists=0,
                 daily_analyses=0,
-                rate_limit=RateLimitInfo(limit=3, remaining=3, is_exceeded=False)
-            )
+                rate_limit=RateLimitInfo(limit=DAILY_ANALYSIS_LIMIT, remaining=DAILY_ANALYSIS_LIMIT, is_exceeded=False)
+            ))
         
-        # Check rate limit
-        is_allowed, remaining = firebase_service.check_rate_limit(user_id, limit=3)
-        
-        return UserStats(
+        return _model_response(UserStats(
             total_analyses=user_data.get('image_analyses_count', 0),
             total_playlists=user_data.get('playlists_created_count', 0),
             daily_analyses=user_data.get('daily_analyses_count', 0),
             rate_limit=RateLimitInfo(
-                limit=3,
+                limit=DAILY_ANALYSIS_LIMIT,
                 remaining=remaining,
                 is_exceeded=not is_allowed
             )
-        )
+        ))
         
     except Exception as e:
         logger.error("Failed to get user stats", user_id=user_id, error=str(e))
@@ -232,8 +249,10 @@ async def get_user_playlists(
     Requires authentication.
     """
     try:
-        playlists = firebase_service.get_user_playlists(user_id, limit=limit)
-        return [PlaylistRecord(**playlist) for playlist in playlists]
+        playlists = get_firebase_service().get_user_playlists(user_id, limit=limit)
+        return ORJSONResponse([
+            PlaylistRecord(**playlist).model_dump(mode="json") for playlist in playlists
+        ])
         
     except Exception as e:
         logger.error("Failed to get user playlists", user_id=user_id, error=str(e))
@@ -251,13 +270,13 @@ async def get_rate_limit_info(user_id: str = Depends(get_current_user_id)):
     Requires authentication.
     """
     try:
-        is_allowed, remaining = firebase_service.check_rate_limit(user_id, limit=3)
+        _, is_allowed, remaining = get_firebase_service().get_user_with_rate_limit(user_id, limit=DAILY_ANALYSIS_LIMIT)
         
-        return RateLimitInfo(
-            limit=3,
+        return _model_response(RateLimitInfo(
+            limit=DAILY_ANALYSIS_LIMIT,
             remaining=remaining,
             is_exceeded=not is_allowed
-        )
+        ))
         
     except Exception as e:
         logger.error("Failed to get rate limit info", user_id=user_id, error=str(e))
@@ -1,21 +1,22 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+import orjson
 import structlog
 
 from app.api.endpoints import router as api_router
 from app.api.users import router as users_router
 from app.utils.middleware import (
-    rate_limit_middleware,
-    request_size_middleware,
-    security_headers_middleware,
+    UnifiedMiddleware,
     request_logging_middleware
 )
-from app.middleware.rate_limit import rate_limit_middleware as firestore_rate_limit
+from app.utils.file_utils import ensure_upload_directory
+from app.utils.responses import ORJSONResponse
 
 # Load environment variables from project root
 # Try multiple possible locations for .env file
@@ -31,8 +32,14 @@ for env_path in env_paths:
         load_dotenv(dotenv_path=env_path)
         break
 
-structlog.configure(
-    processors=[
+def _orjson_dumps(event_dict, **kwargs) -> str:
+    return orjson.dumps(event_dict, **kwargs).decode()
+
+
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+
+if DEBUG:
+    log_processors = [
         structlog.stdlib.filter_by_level,
         structlog.stdlib.add_logger_name,
         structlog.stdlib.add_log_level,
@@ -41,27 +48,44 @@ structlog.configure(
         structlog.processors.StackInfoRenderer(),
         structlog.processors.format_exc_info,
         structlog.processors.UnicodeDecoder(),
-        structlog.processors.JSONRenderer()
-    ],
+        structlog.processors.JSONRenderer(serializer=_orjson_dumps)
+    ]
+else:
+    # Lean chain for production: skips stack/exception rendering and decoding
+    log_processors = [
+        structlog.stdlib.filter_by_level,
+        structlog.stdlib.add_log_level,
+        structlog.processors.TimeStamper(fmt="iso"),
+        structlog.processors.JSONRenderer(serializer=_orjson_dumps)
+    ]
+
+structlog.configure(
+    processors=log_processors,
     context_class=dict,
     logger_factory=structlog.stdlib.LoggerFactory(),
     wrapper_class=structlog.stdlib.BoundLogger,
     cache_logger_on_first_use=True,
 )
 
+logger = structlog.get_logger(__name__)
+
 app = FastAPI(
     title="FestList API",
     description="Festival flyer OCR to Spotify playlist API",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
 )
 
+# Blocking OCR and Gemini calls run here so they don't stall the event loop;
+# the semaphore also caps concurrent upstream Gemini requests.
+OCR_CONCURRENCY = 3
+app.state.ocr_pool = ThreadPoolExecutor(max_workers=OCR_CONCURRENCY, thread_name_prefix="ocr")
+app.state.ocr_semaphore = asyncio.Semaphore(OCR_CONCURRENCY)
+
 app.middleware("http")(request_logging_middleware)
-app.middleware("http")(security_headers_middleware)
-app.middleware("http")(request_size_middleware)
-app.middleware("http")(firestore_rate_limit)  # Firestore-based rate limiting for image analysis
-app.middleware("http")(rate_limit_middleware)  # General IP-based rate limiting
+app.add_middleware(UnifiedMiddleware)  # Request size, IP rate limiting and security headers
 
 app.add_middleware(
     CORSMiddleware,
@@ -72,18 +96,21 @@ app.add_middleware(
         "http://0.0.0.0:3000",
     ],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PATCH", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type"],
+    max_age=86400,
 )
 
 os.makedirs("uploads", exist_ok=True)
+# Resolved once here; handlers read it from app.state instead of hitting the
+# filesystem on every request
+app.state.upload_dir = ensure_upload_directory()
 
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """Handle HTTP exceptions with structured logging."""
-    logger = structlog.get_logger(__name__)
     logger.error(
         "HTTP exception",
         status_code=exc.status_code,
@@ -91,22 +118,22 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         path=request.url.path,
         method=request.method
     )
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
-        content={"error": exc.detail, "status_code": exc.status_code}
+        content={"error": exc.detail, "status_code": exc.status_code},
+        headers=exc.headers
     )
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     """Handle request validation errors."""
-    logger = structlog.get_logger(__name__)
     logger.error(
         "Validation error",
         errors=exc.errors(),
         path=request.url.path,
         method=request.method
     )
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=422,
         content={
             "error": "Validation error",
@@ -118,7 +145,6 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle unexpected exceptions."""
-    logger = structlog.get_logger(__name__)
     logger.error(
         "Unexpected error",
         error=str(exc),
@@ -126,7 +152,7 @@ async def general_exception_handler(request: Request, exc: Exception):
         path=request.url.path,
         method=request.method
     )
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
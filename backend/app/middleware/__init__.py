@@ -1,5 +1,5 @@
 """Middleware package."""
-from .rate_limit import rate_limit_middleware, require_auth, RateLimitExceeded
+from .rate_limit import enforce_analysis_limit, require_auth, verify_token_cached, RateLimitExceeded
 
-__all__ = ['rate_limit_middleware', 'require_auth', 'RateLimitExceeded']
+__all__ = ['enforce_analysis_limit', 'require_auth', 'verify_token_cached', 'RateLimitExceeded']
 
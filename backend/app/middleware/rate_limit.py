@@ -1,24 +1,160 @@
 """
-Rate limiting middleware using Firestore.
+Per-user daily rate limiting using Redis, with Firestore as fallback.
 """
+import time
+import asyncio
+import hashlib
+import math
+import threading
+from datetime import datetime
 from typing import Optional
-from fastapi import Request, HTTPException, status
-from fastapi.responses import JSONResponse
+from weakref import WeakValueDictionary
+from cachetools import TTLCache
+from fastapi import Request, Response, HTTPException, status
 import structlog
 
-from app.services.firebase_service import firebase_service
+from app.services.firebase_service import get_firebase_service, quota_reset_time
+from app.services.redis_service import redis_backend
 
 logger = structlog.get_logger(__name__)
 
 
+# Image analyses (OCR or Gemini Vision) allowed per user per UTC day
+DAILY_ANALYSIS_LIMIT = 3
+
+# Verified token digest -> (uid, exp); avoids re-verifying the signature on
+# every request a session makes with the same ID token.
+_TOKEN_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+# Rejected token digests, held briefly so a client retrying a bad token in a
+# tight loop doesn't trigger a verification per attempt
+_INVALID_TOKEN_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=1)
+_token_cache_lock = threading.Lock()
+
+
+def verify_token_cached(token: str) -> Optional[str]:
+    """
+    Verify a Firebase ID token, reusing earlier verifications.
+    
+    Args:
+        token: Firebase ID token
+        
+    Returns:
+        User ID, or None if the token is invalid
+    """
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    now = time.time()
+    
+    with _token_cache_lock:
+        cached = _TOKEN_CACHE.get(key)
+        rejected = key in _INVALID_TOKEN_CACHE
+    if cached and cached[1] > now:
+        return cached[0]
+    if rejected:
+        return None
+    
+    decoded_token = get_firebase_service().verify_id_token(token)
+    if not decoded_token:
+        with _token_cache_lock:
+            _TOKEN_CACHE.pop(key, None)
+            _INVALID_TOKEN_CACHE[key] = True
+        return None
+    
+    uid = decoded_token.get('uid')
+    exp = decoded_token.get('exp', now)
+    if exp > now:
+        with _token_cache_lock:
+            _TOKEN_CACHE[key] = (uid, exp)
+    return uid
+
+
+class AnalysisCountBatcher:
+    """Coalesces per-request analysis counts into batched Firestore commits."""
+    
+    def __init__(self, max_batch: int = 250, max_wait: float = 0.1):
+        # Firestore caps a write batch at 500 operations, two per user
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+    
+    def record(
+        self,
+        user_id: str,
+        daily_count: Optional[int] = None,
+        now: Optional[datetime] = None
+    ) -> None:
+        """
+        Queue one successful analysis without blocking the response.
+        
+        Args:
+            user_id: User ID
+            daily_count: Count for the day if tracked in Redis
+            now: Time the analysis was counted at (UTC); defaults to the
+                current time
+        """
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        self._queue.put_nowait((user_id, daily_count, now or datetime.utcnow()))
+    
+    async def _run(self) -> None:
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        while True:
+            records = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(records) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    records.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await asyncio.to_thread(get_firebase_service().apply_analysis_counts, records)
+            except Exception as e:
+                logger.error("Analysis count flush failed", error=str(e), records=len(records))
+
+
+# Global instance
+analysis_counter = AnalysisCountBatcher()
+
+
+# One lock per user with a request in flight; entries vanish once unused
+_user_locks: "WeakValueDictionary[str, asyncio.Lock]" = WeakValueDictionary()
+
+
+def _lock_for(user_id: str) -> asyncio.Lock:
+    """Get the lock serializing this process's quota transactions for a user."""
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _user_locks[user_id] = lock
+    return lock
+
+
 class RateLimitExceeded(HTTPException):
     """Exception raised when rate limit is exceeded."""
     
-    def __init__(self, detail: str = "Rate limit exceeded", remaining: int = 0):
+    def __init__(
+        self,
+        detail: str = "Rate limit exceeded",
+        remaining: int = 0,
+        limit: Optional[int] = None,
+        retry_after: Optional[int] = None
+    ):
+        headers = {"X-RateLimit-Remaining": str(remaining)}
+        if limit is not None:
+            headers["X-RateLimit-Limit"] = str(limit)
+        if retry_after is not None:
+            headers["Retry-After"] = str(retry_after)
         super().__init__(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail=detail,
-            headers={"X-RateLimit-Remaining": str(remaining)}
+            headers=headers
         )
 
 
@@ -27,45 +163,36 @@ async def get_user_id_from_request(request: Request) -> Optional[str]:
     Extract user ID from request.
     
     Tries multiple sources:
-    1. Authorization header (Firebase ID token)
-    2. Request body (user_id field)
+    1. request.state.user_id, if already resolved for this request
+    2. Authorization header (Firebase ID token)
     3. Query parameters (user_id)
     
+    The body is never read: rate-limited endpoints take image references,
+    not user IDs, and buffering it here would cost a full read per request.
+    
     Args:
         request: FastAPI request object
         
     Returns:
         User ID or None if not found
     """
+    user_id = getattr(request.state, 'user_id', None)
+    if user_id:
+        return user_id
+    
     # Try Authorization header first
     auth_header = request.headers.get('Authorization')
     if auth_header and auth_header.startswith('Bearer '):
-        token = auth_header.split('Bearer ')[1]
+        token = auth_header[7:]  # len('Bearer ')
         try:
-            decoded_token = firebase_service.verify_id_token(token)
-            if decoded_token:
-                return decoded_token.get('uid')
+            uid = verify_token_cached(token)
+            if uid:
+                # Shared with downstream handlers through the request scope
+                request.state.user_id = uid
+                return uid
         except Exception as e:
             logger.warning("Failed to verify token", error=str(e))
     
-    # Try request body
-    try:
-        if request.method in ['POST', 'PUT', 'PATCH']:
-            # Store body for later use
-            body = await request.body()
-            request._body = body
-            
-            # Try to parse JSON
-            import json
-            try:
-                body_data = json.loads(body.decode())
-                if 'user_id' in body_data:
-                    return body_data['user_id']
-            except:
-                pass
-    except:
-        pass
-    
     # Try query parameters
     user_id = request.query_params.get('user_id')
     if user_id:
@@ -74,60 +201,96 @@ async def get_user_id_from_request(request: Request) -> Optional[str]:
     return None
 
 
-async def check_rate_limit(request: Request, limit: int = 3) -> tuple[bool, int, Optional[str]]:
+async def check_rate_limit(
+    request: Request,
+    limit: int = 3,
+    now: Optional[datetime] = None
+) -> tuple[bool, int, Optional[str], Optional[str]]:
     """
     Check if request should be rate limited.
     
+    An allowed request is counted atomically with the check against the
+    UTC day, in Redis if configured, otherwise in a Firestore transaction.
+    
     Args:
         request: FastAPI request object
         limit: Maximum requests per day
+        now: Time of the request (UTC); defaults to the current time
         
     Returns:
-        Tuple of (is_allowed, remaining, user_id)
+        Tuple of (is_allowed, remaining, user_id, counted_in), where
+        remaining is what is left once this request is counted (the full
+        limit for unidentified users) and counted_in is "redis", "firestore"
+        or None if the request wasn't counted
     """
     # Get user ID from request
     user_id = await get_user_id_from_request(request)
+    now = now or datetime.utcnow()
     
     if not user_id:
         # No user ID found - for now, allow the request
         # In production, you might want to require authentication
         logger.warning("No user ID found in request, allowing without rate limit")
-        return True, limit, None
+        return True, limit, None, None
     
-    # Check rate limit
-    is_allowed, remaining = firebase_service.check_rate_limit(user_id, limit)
+    if redis_backend.is_available:
+        try:
+            is_allowed, daily_count = await redis_backend.acquire_daily(
+                user_id, limit, now, quota_reset_time(now)
+            )
+            if not is_allowed:
+                return False, 0, user_id, None
+            return True, limit - daily_count, user_id, "redis"
+        except Exception as e:
+            logger.error("Redis rate limit check failed, falling back to Firestore", error=str(e))
     
-    return is_allowed, remaining, user_id
+    # Concurrent transactions on one user document contend server-side and
+    # retry; queueing them here keeps that to one at a time per instance
+    async with _lock_for(user_id):
+        is_allowed, daily_count = await asyncio.to_thread(
+            get_firebase_service().consume_rate_limit, user_id, limit, now
+        )
+    if not is_allowed:
+        return False, 0, user_id, None
+    if not daily_count:
+        # Firestore unavailable; nothing was counted
+        return True, limit - 1, user_id, None
+    return True, limit - daily_count, user_id, "firestore"
+
+
+# Strong references to fire-and-forget releases until they finish
+_pending_releases: set = set()
 
 
-async def rate_limit_middleware(request: Request, call_next, limit: int = 3):
+async def _release_count(user_id: str, counted_in: str, now: datetime) -> None:
+    """Give back a counted request whose analysis failed."""
+    try:
+        if counted_in == "redis":
+            await redis_backend.release_daily(user_id, now)
+        else:
+            await asyncio.to_thread(get_firebase_service().release_rate_limit, user_id, now)
+    except Exception as e:
+        logger.error("Failed to release rate limit count", user_id=user_id, error=str(e))
+
+
+async def enforce_analysis_limit(request: Request, response: Response):
     """
-    Middleware to enforce rate limiting on specific endpoints.
+    Dependency enforcing the daily analysis limit on the routes that use it.
+    
+    Attached per route, so requests to other endpoints never pay for the
+    user lookup. Only requests that complete successfully are counted.
     
     Args:
         request: FastAPI request object
-        call_next: Next middleware/handler
-        limit: Maximum requests per day
+        response: Response whose headers are merged into the route's reply
         
-    Returns:
-        Response from next handler or rate limit error
+    Raises:
+        RateLimitExceeded: If the user has used up today's analyses
     """
-    # Only apply rate limiting to specific endpoints
-    rate_limited_paths = [
-        '/api/v1/analyze-image',
-        '/api/v1/ocr',
-    ]
-    
-    # Check if this path should be rate limited
-    should_rate_limit = any(request.url.path.startswith(path) for path in rate_limited_paths)
-    
-    if not should_rate_limit:
-        # Not a rate-limited endpoint, proceed normally
-        response = await call_next(request)
-        return response
-    
-    # Check rate limit
-    is_allowed, remaining, user_id = await check_rate_limit(request, limit)
+    now = datetime.utcnow()
+    is_allowed, remaining, user_id, counted_in = await check_rate_limit(
+        request, DAILY_ANALYSIS_LIMIT, now
+    )
     
     if not is_allowed:
         logger.warning(
@@ -136,35 +299,33 @@ async def rate_limit_middleware(request: Request, call_next, limit: int = 3):
             path=request.url.path,
             remaining=remaining
         )
-        return JSONResponse(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            content={
-                "detail": "Daily image analysis limit exceeded. You can analyze up to 3 images per day.",
-                "limit": limit,
-                "remaining": remaining,
-                "reset_info": "Limit resets at midnight UTC"
-            },
-            headers={
-                "X-RateLimit-Limit": str(limit),
-                "X-RateLimit-Remaining": str(remaining),
-                "Retry-After": "86400"  # 24 hours in seconds
-            }
+        raise RateLimitExceeded(
+            detail=f"Daily image analysis limit exceeded. You can analyze up to {DAILY_ANALYSIS_LIMIT} images per day.",
+            remaining=remaining,
+            limit=DAILY_ANALYSIS_LIMIT,
+            retry_after=math.ceil((quota_reset_time(now) - now).total_seconds())
         )
     
-    # Proceed with request
-    response = await call_next(request)
-    
-    # Add rate limit headers to response
-    response.headers["X-RateLimit-Limit"] = str(limit)
+    # Error responses are built fresh by the exception handlers, so these
+    # only reach successful responses, which consume one analysis
+    response.headers["X-RateLimit-Limit"] = str(DAILY_ANALYSIS_LIMIT)
     response.headers["X-RateLimit-Remaining"] = str(remaining)
     
-    # If request was successful and user_id exists, increment counter
-    if response.status_code < 400 and user_id:
-        firebase_service.increment_analysis_count(user_id)
-        # Update remaining count in header
-        response.headers["X-RateLimit-Remaining"] = str(max(0, remaining - 1))
+    try:
+        yield
+    except Exception:
+        if counted_in:
+            # Only successful analyses count against the limit; the error
+            # response doesn't wait for the write
+            task = asyncio.create_task(_release_count(user_id, counted_in, now))
+            _pending_releases.add(task)
+            task.add_done_callback(_pending_releases.discard)
+        raise
     
-    return response
+    if counted_in == "redis":
+        # Firestore counts in the same transaction as its check; Redis
+        # counts are mirrored into the user's quota document in batches
+        analysis_counter.record(user_id, DAILY_ANALYSIS_LIMIT - remaining, now)
 
 
 def require_auth(request: Request) -> str:
@@ -189,18 +350,18 @@ def require_auth(request: Request) -> str:
             headers={"WWW-Authenticate": "Bearer"}
         )
     
-    token = auth_header.split('Bearer ')[1]
+    token = auth_header[7:]  # len('Bearer ')
     
     try:
-        decoded_token = firebase_service.verify_id_token(token)
-        if not decoded_token:
+        uid = verify_token_cached(token)
+        if not uid:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authentication token",
                 headers={"WWW-Authenticate": "Bearer"}
             )
         
-        return decoded_token.get('uid')
+        return uid
         
     except Exception as e:
         logger.error("Authentication failed", error=str(e))
@@ -1,5 +1,5 @@
-from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field, field_validator
+from typing import List, Literal, Optional, Dict, Any
+from pydantic import BaseModel, Field
 from enum import Enum
 
 
@@ -60,14 +60,8 @@ class UploadResponse(BaseModel):
 class OCRRequest(BaseModel):
     """Request for OCR processing."""
     file_id: str = Field(..., description="File identifier from upload")
-    engine: Optional[str] = Field("tesseract", description="OCR engine to use")
-    
-    @field_validator('engine')
-    @classmethod
-    def validate_engine(cls, v):
-        if v not in ['tesseract', 'google_vision']:
-            raise ValueError('Engine must be either "tesseract" or "google_vision"')
-        return v
+    # Literal is checked inside pydantic-core, no Python validator call
+    engine: Literal['tesseract', 'google_vision', 'tiered'] = Field("tesseract", description="OCR engine to use")
 
 
 class ArtistExtractionRequest(BaseModel):
@@ -1,20 +1,63 @@
 import os
 import re
-import json
+import heapq
 import asyncio
+from bisect import bisect_right
+from functools import lru_cache
 from typing import List, Dict, Any, Optional, Tuple
-from google.cloud import aiplatform
-from google.auth import default
+import orjson
 import structlog
 
 from .gemini_service import GeminiService
+from app.utils.text_utils import normalize_name
 
 logger = structlog.get_logger(__name__)
 
+FILTER_WORDS = frozenset({
+    'festival', 'fest', 'music', 'stage', 'main', 'tent', 'arena', 'hall',
+    'presents', 'featuring', 'with', 'special', 'guest', 'guests', 'live',
+    'concert', 'show', 'performance', 'event', 'venue', 'location', 'date',
+    'time', 'tickets', 'admission', 'price', 'cost', 'age', 'limit', 'door',
+    'doors', 'open', 'start', 'end', 'saturday', 'sunday', 'monday', 'tuesday',
+    'wednesday', 'thursday', 'friday', 'january', 'february', 'march', 'april',
+    'may', 'june', 'july', 'august', 'september', 'october', 'november', 'december',
+    'am', 'pm', 'sponsored', 'by', 'presented', 'produced', 'organized'
+})
+
+# One scan per line marks every filter word; candidate matches overlapping a
+# marked span are dropped without splitting and lowercasing each match
+_FILTER_WORD_RE = re.compile(
+    r'\b(?:' + '|'.join(sorted(FILTER_WORDS, key=len, reverse=True)) + r')\b',
+    re.IGNORECASE
+)
+
+ARTIST_PATTERNS = [
+    re.compile(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b'),
+    re.compile(r'\b[A-Z]+\b'),
+    re.compile(r'\b[A-Z][a-z]+(?:\s+&\s+[A-Z][a-z]+)+\b'),
+    re.compile(r'\b[A-Z][a-z]+(?:\s+and\s+[A-Z][a-z]+)+\b'),
+]
+
+_WHITESPACE_RE = re.compile(r'\s+')
+# Times, prices, dates, URLs and emails stripped from OCR text, as one
+# alternation so the text is scanned once rather than once per kind
+_NOISE_RE = re.compile(
+    r'\b\d{1,2}[:/]\d{2}\b'
+    r'|\$\d+'
+    r'|\b\d{1,2}/\d{1,2}/\d{2,4}\b'
+    r'|\bwww\.\S+\b'
+    r'|\b\S+@\S+\.\S+\b'
+)
+
 
 class ArtistExtractionService:
     """Service for extracting artist names from festival flyer text."""
     
+    # Skip the AI round-trip when patterns alone already found this many
+    # artists at this confidence or above
+    STRONG_PATTERN_CONFIDENCE = 0.85
+    MIN_STRONG_PATTERN_MATCHES = 10
+    
     def __init__(self):
         self.project_id = os.getenv("GOOGLE_CLOUD_PROJECT_ID")
         self.location = "us-central1"
@@ -23,47 +66,33 @@ class ArtistExtractionService:
 
         if self.project_id:
             try:
+                # Heavy SDK; only loaded when a Vertex project is configured
+                from google.cloud import aiplatform
                 aiplatform.init(project=self.project_id, location=self.location)
                 logger.info("Vertex AI initialized", project_id=self.project_id)
             except Exception as e:
                 logger.error("Failed to initialize Vertex AI", error=str(e))
                 self.project_id = None
         
-        self.filter_words = {
-            'festival', 'fest', 'music', 'stage', 'main', 'tent', 'arena', 'hall',
-            'presents', 'featuring', 'with', 'special', 'guest', 'guests', 'live',
-            'concert', 'show', 'performance', 'event', 'venue', 'location', 'date',
-            'time', 'tickets', 'admission', 'price', 'cost', 'age', 'limit', 'door',
-            'doors', 'open', 'start', 'end', 'saturday', 'sunday', 'monday', 'tuesday',
-            'wednesday', 'thursday', 'friday', 'january', 'february', 'march', 'april',
-            'may', 'june', 'july', 'august', 'september', 'october', 'november', 'december',
-            'am', 'pm', 'sponsored', 'by', 'presented', 'produced', 'organized'
-        }
-        
-        self.artist_patterns = [
-            r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b',
-            r'\b[A-Z]+\b',
-            r'\b[A-Z][a-z]+(?:\s+&\s+[A-Z][a-z]+)+\b',
-            r'\b[A-Z][a-z]+(?:\s+and\s+[A-Z][a-z]+)+\b',
-        ]
+        self.filter_words = FILTER_WORDS
+        self.artist_patterns = ARTIST_PATTERNS
     
-    def clean_text(self, text: str) -> str:
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def clean_text(text: str) -> str:
         """
         Clean and normalize text for processing.
         
+        Memoized: the same OCR text is commonly re-submitted for a file.
+        
         Args:
             text: Raw text from OCR
             
         Returns:
             Cleaned text
         """
-        text = re.sub(r'\s+', ' ', text.strip())
-        
-        text = re.sub(r'\b\d{1,2}[:/]\d{2}\b', '', text)
-        text = re.sub(r'\$\d+', '', text)
-        text = re.sub(r'\b\d{1,2}/\d{1,2}/\d{2,4}\b', '', text)
-        text = re.sub(r'\bwww\.\S+\b', '', text)
-        text = re.sub(r'\b\S+@\S+\.\S+\b', '', text)
+        text = _WHITESPACE_RE.sub(' ', text.strip())
+        text = _NOISE_RE.sub('', text)
         
         return text.strip()
     
@@ -79,24 +108,41 @@ class ArtistExtractionService:
         """
         potential_artists = []
         text_lines = text.split('\n')
+        # Lowercased once; the same candidate often matches several patterns
+        # or lines, so its occurrence count is memoized per call
+        lower_text = text.lower()
+        occurrence_counts: Dict[str, int] = {}
         
         for line in text_lines:
             line = line.strip()
             if not line or len(line) < 2:
                 continue
             
+            filtered_spans = [m.span() for m in _FILTER_WORD_RE.finditer(line)]
+            filtered_starts = [start for start, _ in filtered_spans]
+            filtered_ends = [end for _, end in filtered_spans]
+            
             for pattern in self.artist_patterns:
-                matches = re.findall(pattern, line)
-                
-                for match in matches:
-                    words = match.lower().split()
-                    if any(word in self.filter_words for word in words):
+                for match_obj in pattern.finditer(line):
+                    start, end = match_obj.span()
+                    # Spans are sorted and disjoint: find the first one ending
+                    # after this match starts and see if it begins before it ends
+                    i = bisect_right(filtered_ends, start)
+                    if i < len(filtered_starts) and filtered_starts[i] < end:
                         continue
                     
+                    match = match_obj.group()
+                    
                     if len(match) < 2 or len(match) > 50:
                         continue
                     
-                    confidence = self.calculate_pattern_confidence(match, line, text)
+                    match_lower = match.lower()
+                    occurrences = occurrence_counts.get(match_lower)
+                    if occurrences is None:
+                        occurrences = lower_text.count(match_lower)
+                        occurrence_counts[match_lower] = occurrences
+                    
+                    confidence = self.calculate_pattern_confidence(match, line, occurrences)
                     
                     if confidence > 0.3:
                         potential_artists.append({
@@ -106,25 +152,24 @@ class ArtistExtractionService:
                             "context": line.strip()
                         })
         
-        seen = set()
-        unique_artists = []
+        # Keep the best-scoring entry per name, then take the top 20 without
+        # sorting every candidate
+        best: Dict[str, Dict[str, Any]] = {}
+        for artist in potential_artists:
+            name_key = normalize_name(artist['name'])
+            if name_key not in best or artist['confidence'] > best[name_key]['confidence']:
+                best[name_key] = artist
         
-        for artist in sorted(potential_artists, key=lambda x: x['confidence'], reverse=True):
-            name_lower = artist['name'].lower()
-            if name_lower not in seen:
-                seen.add(name_lower)
-                unique_artists.append(artist)
-        
-        return unique_artists[:20]
+        return heapq.nlargest(20, best.values(), key=lambda x: x['confidence'])
     
-    def calculate_pattern_confidence(self, match: str, line: str, full_text: str) -> float:
+    def calculate_pattern_confidence(self, match: str, line: str, occurrences: int) -> float:
         """
         Calculate confidence score for a pattern match.
         
         Args:
             match: The matched text
             line: The line containing the match
-            full_text: The full text
+            occurrences: Case-insensitive occurrences of the match in the full text
             
         Returns:
             Confidence score between 0 and 1
@@ -148,7 +193,6 @@ class ArtistExtractionService:
             confidence -= 0.2
         
         # Boost for appearing multiple times
-        occurrences = full_text.lower().count(match.lower())
         if occurrences > 1:
             confidence += min(0.2, occurrences * 0.05)
         
@@ -196,7 +240,8 @@ class ArtistExtractionService:
             
             model = TextGenerationModel.from_pretrained("text-bison@001")
             
-            response = model.predict(
+            response = await asyncio.to_thread(
+                model.predict,
                 prompt,
                 temperature=0.1,
                 max_output_tokens=1024,
@@ -208,7 +253,7 @@ class ArtistExtractionService:
             
             json_match = re.search(r'\[.*\]', response_text, re.DOTALL)
             if json_match:
-                artists_data = json.loads(json_match.group())
+                artists_data = orjson.loads(json_match.group())
                 
                 valid_artists = []
                 for artist in artists_data:
@@ -269,20 +314,31 @@ class ArtistExtractionService:
             
             cleaned_text = self.clean_text(text)
             
-            pattern_artists = self.extract_with_patterns(cleaned_text)
+            # Pure-Python scoring; keep it off the event loop
+            pattern_artists = await asyncio.to_thread(self.extract_with_patterns, cleaned_text)
+            
+            # Patterns take milliseconds against seconds for a model call, so
+            # scoring them first to decide whether the call is needed at all
+            # costs far less than it can save
+            strong_matches = sum(
+                1 for artist in pattern_artists
+                if artist['confidence'] >= self.STRONG_PATTERN_CONFIDENCE
+            )
             
             ai_artists = []
-            if use_ai:
+            if use_ai and strong_matches < self.MIN_STRONG_PATTERN_MATCHES:
                 ai_artists = await self.extract_with_gemini(cleaned_text)
 
                 if not ai_artists:
                     ai_artists = await self.extract_with_vertex_ai(cleaned_text)
+            elif use_ai:
+                logger.info("Skipping AI extraction, pattern matches are confident", strong_matches=strong_matches)
             
             all_artists = pattern_artists + ai_artists
             
             merged_artists = {}
             for artist in all_artists:
-                name_key = artist['name'].lower()
+                name_key = normalize_name(artist['name'])
                 
                 if name_key in merged_artists:
                     # Keep the one with higher confidence
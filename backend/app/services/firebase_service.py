@@ -2,15 +2,59 @@
 Firebase/Firestore service for user management and data persistence.
 """
 import os
-from typing import Optional, Dict, Any
+import json
+import threading
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta
-import firebase_admin
-from firebase_admin import credentials, firestore, auth
+from functools import lru_cache
 import structlog
 
 logger = structlog.get_logger(__name__)
 
 
+# Daily counters live in users/{uid}/quota/{YYYY-MM-DD}; the day is part of
+# the key, so rollover needs no read. Old days are removed by a Firestore TTL
+# policy on the quota collection group's expires_at field.
+QUOTA_RETENTION = timedelta(days=2)
+
+
+# Fields the playlist list view needs (PlaylistRecord); the per-artist
+# result lists stored alongside are left out of the response payload
+PLAYLIST_LIST_FIELDS = [
+    'user_id', 'playlist_name', 'spotify_playlist_id',
+    'artists', 'total_tracks', 'created_at'
+]
+
+
+def quota_reset_time(now: datetime) -> datetime:
+    """Start of the UTC day after `now`, when its daily quota resets."""
+    return datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+
+
+def _quota_ref(user_ref, now: datetime):
+    """Reference to a user's quota document for the UTC day of `now`."""
+    return user_ref.collection('quota').document(now.strftime('%Y-%m-%d'))
+
+
+def _consume_quota(transaction, user_ref, limit: int, now: datetime) -> Tuple[bool, int]:
+    """Read and increment the quota document for `now`'s day atomically."""
+    from firebase_admin import firestore
+    
+    quota_ref = _quota_ref(user_ref, now)
+    snapshot = quota_ref.get(transaction=transaction)
+    daily_count = (snapshot.to_dict() or {}).get('count', 0) if snapshot.exists else 0
+    
+    if daily_count >= limit:
+        return False, daily_count
+    
+    transaction.set(quota_ref, {
+        'count': firestore.Increment(1),
+        'expires_at': now + QUOTA_RETENTION
+    }, merge=True)
+    transaction.set(user_ref, {'image_analyses_count': firestore.Increment(1)}, merge=True)
+    return True, daily_count + 1
+
+
 class FirebaseService:
     """Service for Firebase/Firestore operations."""
     
@@ -26,11 +70,22 @@ class FirebaseService:
         """Initialize Firebase Admin SDK."""
         if not FirebaseService._initialized:
             self._initialize_firebase()
+            # The client is never swapped after init, so this is a plain
+            # attribute rather than a property checked on every call
+            self.is_available = self.db is not None
             FirebaseService._initialized = True
     
     def _initialize_firebase(self):
         """Initialize Firebase Admin SDK with credentials."""
         try:
+            # gRPC's fork handlers only matter for forking after the channel
+            # is up, which this app never does
+            os.environ.setdefault('GRPC_ENABLE_FORK_SUPPORT', '0')
+            
+            # Imported here so the SDK and its gRPC stack load on first use
+            import firebase_admin
+            from firebase_admin import credentials, firestore
+            
             # Check if already initialized
             if firebase_admin._apps:
                 logger.info("Firebase already initialized")
@@ -43,7 +98,6 @@ class FirebaseService:
             
             if cred_json:
                 # Parse JSON string
-                import json
                 cred_dict = json.loads(cred_json)
                 cred = credentials.Certificate(cred_dict)
                 logger.info("Initializing Firebase with JSON credentials")
@@ -61,15 +115,21 @@ class FirebaseService:
             self.db = firestore.client()
             logger.info("Firebase initialized successfully")
             
+            # Open the gRPC channel (TLS + HTTP/2 setup) off the request path
+            threading.Thread(target=self._warm_up_channel, daemon=True).start()
+            
         except Exception as e:
             logger.error("Failed to initialize Firebase", error=str(e))
             # For development, we can continue without Firebase
             self.db = None
     
-    @property
-    def is_available(self) -> bool:
-        """Check if Firebase is available."""
-        return self.db is not None
+    def _warm_up_channel(self):
+        """Issue a cheap read so the first real query finds the channel ready."""
+        try:
+            self.db.collection('_warmup').limit(1).get()
+            logger.info("Firestore channel warmed up")
+        except Exception as e:
+            logger.warning("Firestore warm-up failed", error=str(e))
     
     def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -113,19 +173,24 @@ class FirebaseService:
             return False
         
         try:
-            user_ref = self.db.collection('users').document(user_id)
-            
-            # Add timestamps
-            now = datetime.utcnow()
-            user_data['updated_at'] = now
+            from firebase_admin import firestore
+            from google.api_core.exceptions import NotFound
             
-            # Check if user exists
-            if not user_ref.get().exists:
-                user_data['created_at'] = now
-                user_data['image_analyses_count'] = 0
-                user_data['playlists_created_count'] = 0
+            user_ref = self.db.collection('users').document(user_id)
+            update = {**user_data, 'updated_at': firestore.SERVER_TIMESTAMP}
+            
+            # Existing users take one write; only a missing document costs
+            # a second round-trip to seed it
+            try:
+                user_ref.update(update)
+            except NotFound:
+                # Increment(0) seeds missing counters without clobbering
+                # any a concurrent request has already started
+                update['created_at'] = firestore.SERVER_TIMESTAMP
+                update['image_analyses_count'] = firestore.Increment(0)
+                update['playlists_created_count'] = firestore.Increment(0)
+                user_ref.set(update, merge=True)
             
-            user_ref.set(user_data, merge=True)
             logger.info("User created/updated", user_id=user_id)
             return True
             
@@ -133,80 +198,58 @@ class FirebaseService:
             logger.error("Failed to create/update user", user_id=user_id, error=str(e))
             return False
     
-    def check_rate_limit(self, user_id: str, limit: int = 3) -> tuple[bool, int]:
+    def consume_rate_limit(
+        self,
+        user_id: str,
+        limit: int = 3,
+        now: Optional[datetime] = None
+    ) -> Tuple[bool, int]:
         """
-        Check if user has exceeded daily rate limit for image analysis.
+        Check the daily rate limit and count this analysis in one transaction.
+        
+        The read, the day rollover and the increment commit together, so
+        concurrent requests from the same user can't both take the last slot.
+        Use release_rate_limit to give the slot back if the analysis fails.
         
         Args:
             user_id: User ID
             limit: Maximum number of analyses per day (default: 3)
+            now: Time of the request (UTC); defaults to the current time
             
         Returns:
-            Tuple of (is_allowed, remaining_count)
+            Tuple of (is_allowed, analyses today including this one if it
+            was allowed)
         """
         if not self.is_available:
             logger.warning("Firebase not available, allowing request")
-            return True, limit
+            return True, 0
         
         try:
-            user_ref = self.db.collection('users').document(user_id)
-            user_doc = user_ref.get()
-            
-            if not user_doc.exists:
-                # New user, create document
-                self.create_or_update_user(user_id, {})
-                return True, limit - 1
-            
-            user_data = user_doc.to_dict()
+            from firebase_admin import firestore
             
-            # Get today's date (UTC)
-            today = datetime.utcnow().date()
-            
-            # Check last reset date
-            last_reset = user_data.get('rate_limit_reset_date')
-            if last_reset:
-                # Convert Firestore timestamp to date
-                if hasattr(last_reset, 'date'):
-                    last_reset_date = last_reset.date()
-                else:
-                    last_reset_date = last_reset
-                
-                # Reset counter if it's a new day
-                if last_reset_date < today:
-                    user_ref.update({
-                        'daily_analyses_count': 0,
-                        'rate_limit_reset_date': datetime.utcnow()
-                    })
-                    return True, limit - 1
-            else:
-                # First time, set reset date
-                user_ref.update({
-                    'daily_analyses_count': 0,
-                    'rate_limit_reset_date': datetime.utcnow()
-                })
-                return True, limit - 1
-            
-            # Check current count
-            daily_count = user_data.get('daily_analyses_count', 0)
+            user_ref = self.db.collection('users').document(user_id)
+            consume_quota = firestore.transactional(_consume_quota)
+            is_allowed, daily_count = consume_quota(
+                self.db.transaction(), user_ref, limit, now or datetime.utcnow()
+            )
             
-            if daily_count >= limit:
+            if not is_allowed:
                 logger.warning("Rate limit exceeded", user_id=user_id, count=daily_count)
-                return False, 0
-            
-            remaining = limit - daily_count
-            return True, remaining
+            return is_allowed, daily_count
             
         except Exception as e:
             logger.error("Failed to check rate limit", user_id=user_id, error=str(e))
             # On error, allow the request
-            return True, limit
+            return True, 0
     
-    def increment_analysis_count(self, user_id: str) -> bool:
+    def release_rate_limit(self, user_id: str, now: Optional[datetime] = None) -> bool:
         """
-        Increment the daily analysis count for a user.
+        Give back an analysis counted by consume_rate_limit.
         
         Args:
             user_id: User ID
+            now: The `now` the analysis was counted at, so a release that
+                runs past midnight still lands on that day's document
             
         Returns:
             True if successful, False otherwise
@@ -215,16 +258,133 @@ class FirebaseService:
             return False
         
         try:
+            from firebase_admin import firestore
+            
+            now = now or datetime.utcnow()
             user_ref = self.db.collection('users').document(user_id)
-            user_ref.update({
-                'daily_analyses_count': firestore.Increment(1),
-                'image_analyses_count': firestore.Increment(1)
-            })
-            logger.info("Analysis count incremented", user_id=user_id)
+            batch = self.db.batch()
+            batch.set(_quota_ref(user_ref, now), {
+                'count': firestore.Increment(-1),
+                'expires_at': now + QUOTA_RETENTION
+            }, merge=True)
+            batch.set(user_ref, {'image_analyses_count': firestore.Increment(-1)}, merge=True)
+            batch.commit()
             return True
             
         except Exception as e:
-            logger.error("Failed to increment analysis count", user_id=user_id, error=str(e))
+            logger.error("Failed to release rate limit count", user_id=user_id, error=str(e))
+            return False
+    
+    def get_user_with_rate_limit(
+        self,
+        user_id: str,
+        limit: int = 3
+    ) -> tuple[Optional[Dict[str, Any]], bool, int]:
+        """
+        Get user document and rate limit status from a single batched read.
+        
+        Unlike consume_rate_limit this never writes. The returned user data
+        carries today's count as daily_analyses_count and the next reset as
+        rate_limit_reset_date, replacing any stale values stored on the user
+        document by older versions.
+        
+        Args:
+            user_id: User ID
+            limit: Maximum number of analyses per day (default: 3)
+            
+        Returns:
+            Tuple of (user_data or None, is_allowed, remaining_count)
+        """
+        if not self.is_available:
+            logger.warning("Firebase not available")
+            return None, True, limit
+        
+        try:
+            now = datetime.utcnow()
+            user_ref = self.db.collection('users').document(user_id)
+            quota_ref = _quota_ref(user_ref, now)
+            
+            # One round-trip for both documents; results come back unordered
+            snapshots = {
+                snapshot.reference.path: snapshot
+                for snapshot in self.db.get_all([user_ref, quota_ref])
+            }
+            user_doc = snapshots.get(user_ref.path)
+            quota_doc = snapshots.get(quota_ref.path)
+            
+        except Exception as e:
+            logger.error("Failed to get user", user_id=user_id, error=str(e))
+            return None, True, limit
+        
+        if not user_doc or not user_doc.exists:
+            return None, True, limit
+        
+        daily_count = 0
+        if quota_doc and quota_doc.exists:
+            daily_count = (quota_doc.to_dict() or {}).get('count', 0)
+        
+        user_data = user_doc.to_dict()
+        user_data['daily_analyses_count'] = daily_count
+        user_data['rate_limit_reset_date'] = quota_reset_time(now)
+        remaining = max(0, limit - daily_count)
+        return user_data, daily_count < limit, remaining
+    
+    def apply_analysis_counts(self, records: List[Tuple[str, Optional[int], datetime]]) -> bool:
+        """
+        Persist a batch of successful analyses in a single Firestore commit.
+        
+        Records for the same user and day are coalesced into one write to
+        that day's quota document, and records for the same user into one
+        write to the user document. A record carrying a daily count (tracked
+        in Redis for the same UTC day) sets the counter; one without is a
+        plain increment.
+        
+        Args:
+            records: (user_id, daily_count or None, time counted at) per
+                successful analysis; at most 250 records per call
+            
+        Returns:
+            True if successful, False otherwise
+        """
+        if not self.is_available or not records:
+            return False
+        
+        increments: Dict[str, int] = {}
+        day_increments: Dict[Tuple[str, str], int] = {}
+        daily_counts: Dict[Tuple[str, str], int] = {}
+        days: Dict[str, datetime] = {}
+        for user_id, daily_count, counted_at in records:
+            day = counted_at.strftime('%Y-%m-%d')
+            days.setdefault(day, counted_at)
+            increments[user_id] = increments.get(user_id, 0) + 1
+            key = (user_id, day)
+            day_increments[key] = day_increments.get(key, 0) + 1
+            if daily_count is not None:
+                daily_counts[key] = max(daily_counts.get(key, 0), daily_count)
+        
+        try:
+            from firebase_admin import firestore
+            
+            batch = self.db.batch()
+            for (user_id, day), count in day_increments.items():
+                user_ref = self.db.collection('users').document(user_id)
+                if (user_id, day) in daily_counts:
+                    daily = daily_counts[(user_id, day)]
+                else:
+                    daily = firestore.Increment(count)
+                batch.set(_quota_ref(user_ref, days[day]), {
+                    'count': daily,
+                    'expires_at': days[day] + QUOTA_RETENTION
+                }, merge=True)
+            for user_id, count in increments.items():
+                user_ref = self.db.collection('users').document(user_id)
+                batch.set(user_ref, {'image_analyses_count': firestore.Increment(count)}, merge=True)
+            batch.commit()
+            logger.info("Analysis counts committed", users=len(increments), analyses=len(records))
+            return True
+            
+        except Exception as e:
+            logger.error("Failed to commit analysis counts", users=len(increments), error=str(e))
             return False
     
     def save_playlist(self, user_id: str, playlist_data: Dict[str, Any]) -> Optional[str]:
@@ -242,19 +402,24 @@ class FirebaseService:
             return None
         
         try:
+            from firebase_admin import firestore
+            
             # Add metadata
             playlist_data['user_id'] = user_id
-            playlist_data['created_at'] = datetime.utcnow()
-            
-            # Save to playlists collection
-            playlist_ref = self.db.collection('playlists').add(playlist_data)
-            playlist_id = playlist_ref[1].id
+            playlist_data['created_at'] = firestore.SERVER_TIMESTAMP
             
-            # Update user's playlist count
+            # Save the playlist and bump the user's count in one commit; the
+            # document ID is generated client-side
+            playlist_ref = self.db.collection('playlists').document()
+            playlist_id = playlist_ref.id
             user_ref = self.db.collection('users').document(user_id)
-            user_ref.update({
+            
+            batch = self.db.batch()
+            batch.set(playlist_ref, playlist_data)
+            batch.set(user_ref, {
                 'playlists_created_count': firestore.Increment(1)
-            })
+            }, merge=True)
+            batch.commit()
             
             logger.info("Playlist saved", user_id=user_id, playlist_id=playlist_id)
             return playlist_id
@@ -265,7 +430,10 @@ class FirebaseService:
     
     def get_user_playlists(self, user_id: str, limit: int = 10) -> list[Dict[str, Any]]:
         """
-        Get user's playlists from Firestore.
+        Get user's playlists from Firestore, newest first.
+        
+        Served by the composite index (user_id ASC, created_at DESC) on the
+        playlists collection.
         
         Args:
             user_id: User ID
@@ -278,10 +446,14 @@ class FirebaseService:
             return []
         
         try:
+            from firebase_admin import firestore
+            
             playlists_ref = self.db.collection('playlists')
-            query = playlists_ref.where('user_id', '==', user_id).order_by(
+            query = playlists_ref.where(
+                filter=firestore.FieldFilter('user_id', '==', user_id)
+            ).order_by(
                 'created_at', direction=firestore.Query.DESCENDING
-            ).limit(limit)
+            ).select(PLAYLIST_LIST_FIELDS).limit(limit)
             
             playlists = []
             for doc in query.stream():
@@ -309,6 +481,8 @@ class FirebaseService:
             return None
         
         try:
+            from firebase_admin import auth
+            
             decoded_token = auth.verify_id_token(id_token)
             return decoded_token
         except Exception as e:
@@ -316,6 +490,7 @@ class FirebaseService:
             return None
 
 
-# Singleton instance
-firebase_service = FirebaseService()
-
+@lru_cache(maxsize=1)
+def get_firebase_service() -> FirebaseService:
+    """Return the shared FirebaseService, initializing Firebase on first use."""
+    return FirebaseService()
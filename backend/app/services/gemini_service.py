@@ -1,22 +1,139 @@
 import os
-import json
 import re
+import io
+import json
+import asyncio
+from concurrent.futures import Executor
 from typing import List, Dict, Any, Optional
-from PIL import Image
 import structlog
 
-try:
-    import google.generativeai as genai
-    from google.generativeai.types import HarmCategory, HarmBlockThreshold
-    GENAI_AVAILABLE = True
-except ImportError as e:
-    GENAI_AVAILABLE = False
-    genai = None
-    HarmCategory = None
-    HarmBlockThreshold = None
-
 logger = structlog.get_logger(__name__)
 
+# raw_decode parses one JSON value from an offset and ignores what follows,
+# in a single linear pass of the C scanner
+_JSON_DECODER = json.JSONDecoder()
+
+
+class _JSONArrayScanner:
+    """
+    Finds where the first JSON array in streamed text closes.
+    
+    Bracket depth and string state carry over between pieces, so each
+    character is looked at once however the stream is chunked.
+    """
+    
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+    
+    def feed(self, piece: str) -> bool:
+        """Scan the next piece; True once the array has closed."""
+        for char in piece:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif not self.depth:
+                # Text before the array, such as an opening code fence
+                if char == '[':
+                    self.depth = 1
+            elif char == '"':
+                self.in_string = True
+            elif char in '[{':
+                self.depth += 1
+            elif char in ']}':
+                self.depth -= 1
+                if not self.depth:
+                    return True
+        return False
+
+# Longest side Gemini Vision works with; larger flyer photos are downscaled
+# and re-encoded before upload instead of sent as full-resolution PNG
+MAX_IMAGE_SIDE = 1568
+JPEG_QUALITY = 85
+
+# Lowercased names that are never artists
+_EXCLUDED_TERMS = frozenset({
+    'festival', 'music', 'stage', 'main', 'tent', 'area', 'zone',
+    'tickets', 'price', 'cost', 'free', 'admission', 'entry',
+    'food', 'drinks', 'bar', 'restaurant', 'vendor',
+    'parking', 'shuttle', 'transport', 'bus',
+    'saturday', 'sunday', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+    'january', 'february', 'march', 'april', 'may', 'june',
+    'july', 'august', 'september', 'october', 'november', 'december',
+    'am', 'pm', 'time', 'schedule', 'lineup',
+    'sponsored', 'presents', 'featuring', 'with'
+})
+
+# Times ("9:30", "10pm") and prices ("$40") in one pass over the lowercased name
+_TIME_OR_PRICE_RE = re.compile(r'^(?:\d{1,2}(?::\d{2}|am|pm)|\$\d)')
+
+# Prompts are fixed text, built once; the flyer text goes between the
+# prefix and suffix
+_ARTIST_PROMPT_PREFIX = """
+You are an expert music industry professional specializing in festival lineups and artist identification. 
+
+Analyze the following text extracted from a music festival flyer and identify ALL artist and band names mentioned. This includes:
+- Headliner artists
+- Supporting acts
+- DJs and electronic music artists
+- Bands of all genres
+- Solo performers
+- Musical groups and collectives
+
+IMPORTANT RULES:
+1. ONLY extract actual artist/performer names
+2. IGNORE: venue names, festival names, dates, times, ticket prices, sponsors, food vendors, general information
+3. IGNORE: words like "presents", "featuring", "with", "and", "vs", "b2b", "live", "dj set"
+4. Include confidence score (0.0-1.0) based on how certain you are it's an artist name
+5. Consider context clues like typography, positioning, and surrounding text
+
+Return ONLY a valid JSON array in this exact format:
+[
+    {"name": "Artist Name", "confidence": 0.95},
+    {"name": "Band Name", "confidence": 0.87},
+    {"name": "DJ Name", "confidence": 0.92}
+]
+
+Text to analyze:
+"""
+_ARTIST_PROMPT_SUFFIX = "\n\nJSON Response:"
+
+_IMAGE_PROMPT = """
+You are an expert music industry professional analyzing a festival flyer image.
+
+Look at this festival flyer image and identify ALL artist and band names that are performing. This includes:
+- Headliner artists (usually in large text)
+- Supporting acts (medium-sized text)
+- DJs and electronic music artists
+- Bands of all genres
+- Solo performers
+- Musical groups and collectives
+
+IMPORTANT RULES:
+1. ONLY extract actual artist/performer names that you can see in the image
+2. IGNORE: venue names, festival names, dates, times, ticket prices, sponsors, food vendors, general information
+3. IGNORE: words like "presents", "featuring", "with", "and", "vs", "b2b", "live", "dj set"
+4. Pay attention to text size and positioning - larger text usually indicates headliners
+5. Include confidence score (0.0-1.0) based on:
+   - How clearly you can read the text
+   - Text size and prominence (larger = higher confidence)
+   - Context clues that indicate it's an artist name
+   - Typography and design elements
+
+Return ONLY a valid JSON array in this exact format:
+[
+    {"name": "Artist Name", "confidence": 0.95},
+    {"name": "Band Name", "confidence": 0.87},
+    {"name": "DJ Name", "confidence": 0.92}
+]
+
+Analyze the image carefully and extract all visible artist names:"""
+
 
 class GeminiService:
     """Service for using Google Gemini to extract artist names from festival flyer text."""
@@ -25,23 +142,41 @@ class GeminiService:
         """Initialize the Gemini service."""
         self.api_key = os.getenv("GOOGLE_GEMINI_API_KEY")
         self.model = None
+        self.safety_settings = None
+        self.generation_config = None
 
+        if not self.api_key or self.api_key == "your-gemini-api-key-here":
+            logger.warning("GOOGLE_GEMINI_API_KEY not found or still has placeholder value, Gemini service disabled")
+            return
 
-
-        if not GENAI_AVAILABLE:
+        # Imported only when Gemini is configured; the SDK pulls in gRPC and
+        # protobuf, which would otherwise slow down every cold start
+        try:
+            import google.generativeai as genai
+            from google.generativeai.types import HarmCategory, HarmBlockThreshold
+        except ImportError:
             logger.warning("google-generativeai package not available, Gemini service disabled")
             return
 
-        if self.api_key and self.api_key != "your-gemini-api-key-here":
-            try:
-                genai.configure(api_key=self.api_key)
-                self.model = genai.GenerativeModel('gemini-2.0-flash')
-                logger.info("Gemini service initialized successfully")
-            except Exception as e:
-                logger.error("Failed to initialize Gemini service", error=str(e))
-                self.model = None
-        else:
-            logger.warning("GOOGLE_GEMINI_API_KEY not found or still has placeholder value, Gemini service disabled")
+        try:
+            genai.configure(api_key=self.api_key)
+            self.model = genai.GenerativeModel('gemini-2.0-flash')
+            self.safety_settings = {
+                HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+                HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+                HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
+            }
+            self.generation_config = genai.types.GenerationConfig(
+                temperature=0.1,
+                top_p=0.8,
+                top_k=40,
+                max_output_tokens=4096,
+            )
+            logger.info("Gemini service initialized successfully")
+        except Exception as e:
+            logger.error("Failed to initialize Gemini service", error=str(e))
+            self.model = None
     
     def is_available(self) -> bool:
         """Check if Gemini service is available."""
@@ -63,33 +198,11 @@ class GeminiService:
         
         try:
             prompt = self._create_artist_extraction_prompt(text)
+
+            response_text = await self._stream_json_array(prompt)
             
-            safety_settings = None
-            if HarmCategory and HarmBlockThreshold:
-                safety_settings = {
-                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                }
-            
-            generation_config = None
-            if genai:
-                generation_config = genai.types.GenerationConfig(
-                    temperature=0.1,
-                    top_p=0.8,
-                    top_k=40,
-                    max_output_tokens=4096,
-                )
-
-            response = self.model.generate_content(
-                prompt,
-                safety_settings=safety_settings,
-                generation_config=generation_config
-            )
-            
-            if response.text:
-                return self._parse_gemini_response(response.text)
+            if response_text:
+                return self._parse_gemini_response(response_text)
             else:
                 logger.warning("Empty response from Gemini")
                 return []
@@ -98,50 +211,70 @@ class GeminiService:
             logger.error("Gemini artist extraction failed", error=str(e))
             return []
     
+    async def _stream_json_array(self, prompt: str) -> str:
+        """
+        Stream a completion and stop reading once its JSON array has closed.
+        
+        The model often follows the array with a closing code fence or a
+        remark; those trailing tokens are never waited for.
+        
+        Args:
+            prompt: Prompt asking for a JSON array
+            
+        Returns:
+            Response text received up to the end of the array
+        """
+        response = await self.model.generate_content_async(
+            prompt,
+            stream=True,
+            safety_settings=self.safety_settings,
+            generation_config=self.generation_config
+        )
+        
+        chunks = []
+        scanner = _JSONArrayScanner()
+        stream = response.__aiter__()
+        try:
+            async for chunk in stream:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks with no parts (only a finish reason or safety
+                    # ratings) have no text; later chunks still can
+                    continue
+                chunks.append(text)
+                if scanner.feed(text):
+                    break
+        finally:
+            # Stopping early would otherwise leave the RPC's stream open
+            # until garbage collection
+            await stream.aclose()
+            upstream = getattr(response, '_iterator', None)
+            if hasattr(upstream, 'aclose'):
+                await upstream.aclose()
+        
+        return ''.join(chunks)
+    
     def _create_artist_extraction_prompt(self, text: str) -> str:
         """Create a detailed prompt for artist extraction."""
-        return f"""
-You are an expert music industry professional specializing in festival lineups and artist identification. 
-
-Analyze the following text extracted from a music festival flyer and identify ALL artist and band names mentioned. This includes:
-- Headliner artists
-- Supporting acts
-- DJs and electronic music artists
-- Bands of all genres
-- Solo performers
-- Musical groups and collectives
-
-IMPORTANT RULES:
-1. ONLY extract actual artist/performer names
-2. IGNORE: venue names, festival names, dates, times, ticket prices, sponsors, food vendors, general information
-3. IGNORE: words like "presents", "featuring", "with", "and", "vs", "b2b", "live", "dj set"
-4. Include confidence score (0.0-1.0) based on how certain you are it's an artist name
-5. Consider context clues like typography, positioning, and surrounding text
-
-Return ONLY a valid JSON array in this exact format:
-[
-    {{"name": "Artist Name", "confidence": 0.95}},
-    {{"name": "Band Name", "confidence": 0.87}},
-    {{"name": "DJ Name", "confidence": 0.92}}
-]
-
-Text to analyze:
-{text}
-
-JSON Response:"""
+        return "".join((_ARTIST_PROMPT_PREFIX, text, _ARTIST_PROMPT_SUFFIX))
     
     def _parse_gemini_response(self, response_text: str) -> List[Dict[str, Any]]:
         """Parse Gemini's response and extract artist data."""
         try:
             cleaned_text = response_text.strip()
             
-            json_match = re.search(r'\[.*?\]', cleaned_text, re.DOTALL)
-            if not json_match:
+            start = cleaned_text.find('[')
+            if start == -1:
                 logger.warning("No JSON array found in Gemini response")
                 return []
             
-            json_str = json_match.group()
-            artists_data = json.loads(json_str)
+            # Decodes the whole array, including any brackets inside names
+            # that a pattern match would cut short
+            artists_data, _ = _JSON_DECODER.raw_decode(cleaned_text, start)
+            if not isinstance(artists_data, list):
+                logger.warning("No JSON array found in Gemini response")
+                return []
             
             valid_artists = []
             for artist in artists_data:
@@ -176,37 +309,34 @@ JSON Response:"""
     
     def _is_likely_artist_name(self, name: str) -> bool:
         """Basic validation to filter out obvious non-artist names."""
-        name_lower = name.lower().strip()
+        if len(name) < 2:
+            return False
         
-        excluded_terms = {
-            'festival', 'music', 'stage', 'main', 'tent', 'area', 'zone',
-            'tickets', 'price', 'cost', 'free', 'admission', 'entry',
-            'food', 'drinks', 'bar', 'restaurant', 'vendor',
-            'parking', 'shuttle', 'transport', 'bus',
-            'saturday', 'sunday', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday',
-            'january', 'february', 'march', 'april', 'may', 'june',
-            'july', 'august', 'september', 'october', 'november', 'december',
-            'am', 'pm', 'time', 'schedule', 'lineup',
-            'sponsored', 'presents', 'featuring', 'with'
-        }
+        name_lower = name.lower().strip()
         
-        if len(name) < 2 or name_lower in excluded_terms:
-            return False
-            
-        if re.match(r'^\d{1,2}:\d{2}', name) or re.match(r'^\d{1,2}(am|pm)', name_lower):
+        if name_lower in _EXCLUDED_TERMS:
             return False
             
-        if re.match(r'^\$\d+', name) or 'dollar' in name_lower:
+        if 'dollar' in name_lower or _TIME_OR_PRICE_RE.match(name_lower):
             return False
             
         return True
 
-    async def extract_artists_from_image(self, image_path: str) -> List[Dict[str, Any]]:
+    async def extract_artists_from_image(
+        self,
+        image_path: str,
+        executor: Optional[Executor] = None,
+        semaphore: Optional[asyncio.Semaphore] = None
+    ) -> List[Dict[str, Any]]:
         """
         Extract artist names directly from a festival flyer image using Gemini Vision.
 
         Args:
             image_path: Path to the festival flyer image
+            executor: Executor for decoding and re-encoding the image;
+                defaults to the event loop's default executor
+            semaphore: Held only while the image is re-encoded, never
+                across the Gemini request
 
         Returns:
             List of artist dictionaries with confidence scores
@@ -216,32 +346,19 @@ JSON Response:"""
             return []
 
         try:
-            image = Image.open(image_path)
+            loop = asyncio.get_running_loop()
+            if semaphore is None:
+                image_part = await loop.run_in_executor(executor, self._encode_image, image_path)
+            else:
+                async with semaphore:
+                    image_part = await loop.run_in_executor(executor, self._encode_image, image_path)
 
             prompt = self._create_image_analysis_prompt()
 
-            safety_settings = None
-            if HarmCategory and HarmBlockThreshold:
-                safety_settings = {
-                    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                }
-
-            generation_config = None
-            if genai:
-                generation_config = genai.types.GenerationConfig(
-                    temperature=0.1,
-                    top_p=0.8,
-                    top_k=40,
-                    max_output_tokens=4096,
-                )
-
-            response = self.model.generate_content(
-                [prompt, image],
-                safety_settings=safety_settings,
-                generation_config=generation_config
+            response = await self.model.generate_content_async(
+                [prompt, image_part],
+                safety_settings=self.safety_settings,
+                generation_config=self.generation_config
             )
 
             if response.text:
@@ -254,34 +371,38 @@ JSON Response:"""
             logger.error("Gemini image analysis failed", error=str(e))
             return []
 
-    def _create_image_analysis_prompt(self) -> str:
-        return """
-You are an expert music industry professional analyzing a festival flyer image.
-
-Look at this festival flyer image and identify ALL artist and band names that are performing. This includes:
-- Headliner artists (usually in large text)
-- Supporting acts (medium-sized text)
-- DJs and electronic music artists
-- Bands of all genres
-- Solo performers
-- Musical groups and collectives
-
-IMPORTANT RULES:
-1. ONLY extract actual artist/performer names that you can see in the image
-2. IGNORE: venue names, festival names, dates, times, ticket prices, sponsors, food vendors, general information
-3. IGNORE: words like "presents", "featuring", "with", "and", "vs", "b2b", "live", "dj set"
-4. Pay attention to text size and positioning - larger text usually indicates headliners
-5. Include confidence score (0.0-1.0) based on:
-   - How clearly you can read the text
-   - Text size and prominence (larger = higher confidence)
-   - Context clues that indicate it's an artist name
-   - Typography and design elements
-
-Return ONLY a valid JSON array in this exact format:
-[
-    {"name": "Artist Name", "confidence": 0.95},
-    {"name": "Band Name", "confidence": 0.87},
-    {"name": "DJ Name", "confidence": 0.92}
-]
+    def _encode_image(self, image_path: str) -> Dict[str, Any]:
+        """
+        Prepare an image for upload, downscaling and re-encoding as needed.
+        
+        Args:
+            image_path: Path to the image file
+            
+        Returns:
+            Inline image part with mime_type and data
+        """
+        from PIL import Image
+        
+        with Image.open(image_path) as image:
+            if image.format == 'JPEG' and max(image.size) <= MAX_IMAGE_SIDE:
+                # Already small and compressed; send the file as-is
+                with open(image_path, 'rb') as f:
+                    return {'mime_type': 'image/jpeg', 'data': f.read()}
+            
+            # JPEGs can be decoded at a reduced scale straight from the DCT
+            # data, so a large photo is never fully decoded
+            image.draft('RGB', (MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+            image.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.Resampling.LANCZOS)
+            
+            rgb = image if image.mode == 'RGB' else image.convert('RGB')
+            buffer = io.BytesIO()
+            try:
+                rgb.save(buffer, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+            finally:
+                if rgb is not image:
+                    rgb.close()
+        
+        return {'mime_type': 'image/jpeg', 'data': buffer.getvalue()}
 
-Analyze the image carefully and extract all visible artist names:"""
+    def _create_image_analysis_prompt(self) -> str:
+        return _IMAGE_PROMPT
@@ -1,6 +1,12 @@
+import io
 import os
+import asyncio
+import shlex
 import logging
-from typing import Optional, Dict, Any
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Optional, Dict, Any, List
 from PIL import Image
 import cv2
 import numpy as np
@@ -9,21 +15,102 @@ from google.cloud import vision
 from google.auth import default
 import structlog
 
+try:
+    import tesserocr
+    TESSEROCR_AVAILABLE = True
+except ImportError:
+    TESSEROCR_AVAILABLE = False
+    tesserocr = None
+
 logger = structlog.get_logger(__name__)
 
+# Longest side fed to either engine. Flyer text stays legible well below
+# this, and every preprocessing stage and the Vision upload scale with pixels.
+OCR_MAX_SIDE = 2000
+VISION_JPEG_QUALITY = 85
+# Laplacian variance above which a grayscale image counts as sharp enough
+# to threshold directly
+SHARP_LAPLACIAN_VARIANCE = 100.0
+_CLOSE_KERNEL = np.ones((2, 2), np.uint8)
+# Tiered OCR sends an image on to Vision when Tesseract's mean word
+# confidence is below this
+TIERED_CONFIDENCE_THRESHOLD = 60.0
+# Most images Vision accepts in one batch_annotate_images request
+VISION_BATCH_SIZE = 16
+
+# LSTM engine on a single text block. The character whitelist is opt-in:
+# the LSTM decoder doesn't need one, and it costs accuracy on stylized fonts.
+TESSERACT_WHITELIST = os.getenv("TESSERACT_CHAR_WHITELIST", "")
+TESSERACT_CONFIG = "--oem 1 --psm 6"
+if TESSERACT_WHITELIST:
+    TESSERACT_CONFIG += " -c " + shlex.quote(f"tessedit_char_whitelist={TESSERACT_WHITELIST}")
+
+# Columns of Tesseract's TSV word table, as returned by image_to_data
+_TSV_INT_COLUMNS = (
+    'level', 'page_num', 'block_num', 'par_num', 'line_num', 'word_num',
+    'left', 'top', 'width', 'height'
+)
+
+# tesserocr API handles aren't thread-safe, and the OCR pool runs several
+# threads; each keeps its own handle with the models loaded once
+_tess_local = threading.local()
+
+# Worker processes for batch Tesseract runs, started on first use. Spawned
+# rather than forked: the parent holds gRPC channels that don't survive fork.
+_batch_pool: Optional[ProcessPoolExecutor] = None
+_batch_pool_lock = threading.Lock()
+# Built inside each worker process on its first task, never pickled across
+_worker_service: Optional["OCRService"] = None
+
+
+def _get_batch_pool() -> ProcessPoolExecutor:
+    """Get the shared OCR process pool, starting it if needed."""
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is None:
+            _batch_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _batch_pool
+
+
+def _tesseract_worker(image_path: str, include_detailed: bool = False) -> Dict[str, Any]:
+    """Run Tesseract on one image inside a pool worker."""
+    global _worker_service
+    if _worker_service is None:
+        # The pool already runs one worker per core; OpenCV's own thread
+        # pool in each of them would only oversubscribe the CPUs
+        cv2.setNumThreads(1)
+        _worker_service = OCRService(engine="tesseract")
+    return _worker_service.extract_text_tesseract(image_path, include_detailed)
+
 
 class OCRService:
     """Service for performing OCR on festival flyer images."""
     
-    def __init__(self):
-        self.ocr_engine = os.getenv("OCR_ENGINE", "tesseract")
+    def __init__(self, engine: Optional[str] = None):
+        """
+        Set up the configured OCR engine.
+        
+        Args:
+            engine: OCR engine to use; defaults to the OCR_ENGINE env var.
+                Only google_vision and tiered open a Vision client.
+        """
+        self.ocr_engine = engine or os.getenv("OCR_ENGINE", "tesseract")
         self.tesseract_path = os.getenv("TESSERACT_PATH", "/usr/bin/tesseract")
         
-        if self.ocr_engine == "tesseract":
+        if self.ocr_engine != "google_vision":
             pytesseract.pytesseract.tesseract_cmd = self.tesseract_path
         
+        # Share of tiered runs that went on to Vision; updated from the OCR
+        # pool's threads, hence the lock
+        self.tiered_runs = 0
+        self.tiered_escalations = 0
+        self._tiered_lock = threading.Lock()
+        
         self.vision_client = None
-        if self.ocr_engine == "google_vision":
+        if self.ocr_engine in ("google_vision", "tiered"):
             try:
                 self.vision_client = vision.ImageAnnotatorClient()
                 logger.info("Google Vision API client initialized")
@@ -48,20 +135,26 @@ class OCRService:
             if image is None:
                 raise ValueError(f"Could not read image from {image_path}")
             
+            # Downscale before the O(pixels) filters below
+            height, width = image.shape[:2]
+            scale = OCR_MAX_SIDE / max(height, width)
+            if scale < 1.0:
+                image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            
             # Convert to grayscale
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
             
-            # Apply Gaussian blur to reduce noise
-            blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-            
-            # Apply adaptive thresholding
-            thresh = cv2.adaptiveThreshold(
-                blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
-            )
-            
-            # Morphological operations to clean up the image
-            kernel = np.ones((2, 2), np.uint8)
-            cleaned = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+            # Clean digital flyers only need binarizing; blur and closing
+            # erode their thin strokes. Noisy scans and photos keep the
+            # denoising pipeline, with a lighter blur.
+            if cv2.Laplacian(gray, cv2.CV_64F).var() > SHARP_LAPLACIAN_VARIANCE:
+                _, cleaned = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+            else:
+                blurred = cv2.GaussianBlur(gray, (3, 3), 0)
+                thresh = cv2.adaptiveThreshold(
+                    blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
+                )
+                cleaned = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, _CLOSE_KERNEL)
             
             logger.info("Image preprocessing completed", image_path=image_path)
             return cleaned
@@ -70,12 +163,13 @@ class OCRService:
             logger.error("Image preprocessing failed", error=str(e), image_path=image_path)
             raise
     
-    def extract_text_tesseract(self, image_path: str) -> Dict[str, Any]:
+    def extract_text_tesseract(self, image_path: str, include_detailed: bool = False) -> Dict[str, Any]:
         """
         Extract text using Tesseract OCR.
         
         Args:
             image_path: Path to the image file
+            include_detailed: Whether to include the per-word table
             
         Returns:
             Dictionary containing extracted text and confidence scores
@@ -83,11 +177,16 @@ class OCRService:
         try:
             processed_image = self.preprocess_image(image_path)
             
-            custom_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,!?@#$%^&*()_+-=[]{}|;:\'\"<>?/~` '
+            # One recognition pass; the text is rebuilt line by line from the
+            # word table instead of running image_to_string as well
+            data = self._tesseract_word_table(processed_image)
             
-            text = pytesseract.image_to_string(processed_image, config=custom_config)
-            
-            data = pytesseract.image_to_data(processed_image, output_type=pytesseract.Output.DICT)
+            lines: Dict[tuple, list] = {}
+            for i, word in enumerate(data['text']):
+                if word.strip():
+                    key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+                    lines.setdefault(key, []).append(word)
+            text = "\n".join(" ".join(words) for words in lines.values())
             
             confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
             avg_confidence = sum(confidences) / len(confidences) if confidences else 0
@@ -99,24 +198,79 @@ class OCRService:
                 avg_confidence=avg_confidence
             )
             
-            return {
+            result = {
                 "text": text.strip(),
                 "confidence": avg_confidence,
                 "engine": "tesseract",
-                "word_count": len(text.split()),
-                "detailed_data": data
+                "word_count": len(text.split())
             }
+            if include_detailed:
+                result["detailed_data"] = data
+            return result
             
         except Exception as e:
             logger.error("Tesseract OCR failed", error=str(e), image_path=image_path)
             raise
     
-    def extract_text_google_vision(self, image_path: str) -> Dict[str, Any]:
+    def _tesseract_word_table(self, image: np.ndarray) -> Dict[str, list]:
+        """
+        Run Tesseract on a preprocessed image and return its word table.
+        
+        Uses libtesseract in-process through tesserocr when installed,
+        avoiding pytesseract's subprocess and temporary PNG per call.
+        
+        Args:
+            image: Preprocessed single-channel image
+            
+        Returns:
+            Word table in pytesseract's Output.DICT layout
+        """
+        if TESSEROCR_AVAILABLE:
+            try:
+                api = getattr(_tess_local, 'api', None)
+                if api is None:
+                    api = tesserocr.PyTessBaseAPI(
+                        lang='eng', psm=tesserocr.PSM.SINGLE_BLOCK, oem=tesserocr.OEM.LSTM_ONLY
+                    )
+                    if TESSERACT_WHITELIST:
+                        api.SetVariable('tessedit_char_whitelist', TESSERACT_WHITELIST)
+                    _tess_local.api = api
+                
+                height, width = image.shape[:2]
+                api.SetImageBytes(image.tobytes(), width, height, 1, width)
+                return self._parse_tesseract_tsv(api.GetTSVText(0))
+            except Exception as e:
+                logger.warning("tesserocr failed, falling back to pytesseract", error=str(e))
+        
+        return pytesseract.image_to_data(
+            image, config=TESSERACT_CONFIG, output_type=pytesseract.Output.DICT
+        )
+    
+    @staticmethod
+    def _parse_tesseract_tsv(tsv: str) -> Dict[str, list]:
+        """Convert headerless Tesseract TSV rows into column lists."""
+        data: Dict[str, list] = {column: [] for column in _TSV_INT_COLUMNS}
+        data['conf'] = []
+        data['text'] = []
+        
+        for row in tsv.splitlines():
+            fields = row.split('\t', 11)
+            if len(fields) < 11:
+                continue
+            for column, value in zip(_TSV_INT_COLUMNS, fields):
+                data[column].append(int(value))
+            data['conf'].append(float(fields[10]))
+            data['text'].append(fields[11] if len(fields) > 11 else '')
+        
+        return data
+    
+    def extract_text_google_vision(self, image_path: str, include_detailed: bool = False) -> Dict[str, Any]:
         """
         Extract text using Google Vision API.
         
         Args:
-            image_path: Path to the image file
+            image_path: Path to the image file, or a gs:// URI
+            include_detailed: Whether to include per-word boxes
             
         Returns:
             Dictionary containing extracted text and confidence scores
@@ -125,35 +279,131 @@ class OCRService:
             if not self.vision_client:
                 raise ValueError("Google Vision client not initialized")
             
-            with open(image_path, 'rb') as image_file:
-                content = image_file.read()
-            
-            image = vision.Image(content=content)
+            image = self._vision_image(image_path)
             
             response = self.vision_client.text_detection(image=image)
-            texts = response.text_annotations
+            return self._parse_vision_response(response, image_path, include_detailed)
+            
+        except Exception as e:
+            logger.error("Google Vision OCR failed", error=str(e), image_path=image_path)
+            raise
+    
+    async def extract_text_google_vision_async(
+        self,
+        image_path: str,
+        executor: Optional[Executor] = None,
+        include_detailed: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Extract text using Google Vision API without tying up an OCR worker.
+        
+        Only reading and re-encoding the image needs the executor; the RPC
+        waits in its own thread, so Vision calls aren't queued behind
+        CPU-bound Tesseract work.
+        
+        Args:
+            image_path: Path to the image file, or a gs:// URI
+            executor: Executor for reading and re-encoding the image;
+                defaults to the event loop's default executor
+            include_detailed: Whether to include per-word boxes
             
-            if response.error.message:
-                raise Exception(f"Google Vision API error: {response.error.message}")
+        Returns:
+            Dictionary containing extracted text and confidence scores
+        """
+        try:
+            if not self.vision_client:
+                raise ValueError("Google Vision client not initialized")
             
-            if not texts:
-                return {
-                    "text": "",
-                    "confidence": 0,
-                    "engine": "google_vision",
-                    "word_count": 0,
-                    "detailed_data": []
-                }
+            loop = asyncio.get_running_loop()
+            image = await loop.run_in_executor(executor, self._vision_image, image_path)
             
-            full_text = texts[0].description
+            response = await asyncio.to_thread(self.vision_client.text_detection, image=image)
+            return self._parse_vision_response(response, image_path, include_detailed)
             
-            confidences = []
-            detailed_data = []
+        except Exception as e:
+            logger.error("Google Vision OCR failed", error=str(e), image_path=image_path)
+            raise
+    
+    def extract_text_google_vision_batch(
+        self,
+        image_paths: List[str],
+        include_detailed: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Extract text from several images with one Vision request per 16 images.
+        
+        Args:
+            image_paths: Paths to the image files, or gs:// URIs
+            include_detailed: Whether to include per-word boxes
             
-            for text in texts[1:]:
-                if hasattr(text, 'confidence'):
-                    confidences.append(text.confidence)
-                
+        Returns:
+            Results in the same order as image_paths
+        """
+        try:
+            if not self.vision_client:
+                raise ValueError("Google Vision client not initialized")
+            
+            features = [vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)]
+            results = []
+            for i in range(0, len(image_paths), VISION_BATCH_SIZE):
+                chunk = image_paths[i:i + VISION_BATCH_SIZE]
+                requests = [
+                    vision.AnnotateImageRequest(
+                        image=self._vision_image(path),
+                        features=features
+                    )
+                    for path in chunk
+                ]
+                batch = self.vision_client.batch_annotate_images(requests=requests)
+                results.extend(
+                    self._parse_vision_response(response, path, include_detailed)
+                    for path, response in zip(chunk, batch.responses)
+                )
+            
+            return results
+            
+        except Exception as e:
+            logger.error("Google Vision batch OCR failed", error=str(e), images=len(image_paths))
+            raise
+    
+    def _parse_vision_response(self, response, image_path: str, include_detailed: bool = False) -> Dict[str, Any]:
+        """
+        Build an OCR result from one Vision text detection response.
+        
+        Args:
+            response: Vision AnnotateImageResponse
+            image_path: Path of the image the response belongs to
+            include_detailed: Whether to include per-word boxes
+            
+        Returns:
+            Dictionary containing extracted text and confidence scores
+        """
+        texts = response.text_annotations
+        
+        if response.error.message:
+            raise Exception(f"Google Vision API error: {response.error.message}")
+        
+        if not texts:
+            result = {
+                "text": "",
+                "confidence": 0,
+                "engine": "google_vision",
+                "word_count": 0
+            }
+            if include_detailed:
+                result["detailed_data"] = []
+            return result
+        
+        full_text = texts[0].description
+        
+        confidences = []
+        detailed_data = []
+        
+        for text in texts[1:]:
+            if hasattr(text, 'confidence'):
+                confidences.append(text.confidence)
+            
+            if include_detailed:
                 detailed_data.append({
                     "text": text.description,
                     "confidence": getattr(text, 'confidence', 0),
@@ -161,50 +411,242 @@ class OCRService:
                         (vertex.x, vertex.y) for vertex in text.bounding_poly.vertices
                     ]
                 })
+        
+        avg_confidence = (sum(confidences) / len(confidences) * 100) if confidences else 95
+        
+        logger.info(
+            "Google Vision OCR completed",
+            image_path=image_path,
+            text_length=len(full_text),
+            avg_confidence=avg_confidence
+        )
+        
+        result = {
+            "text": full_text.strip(),
+            "confidence": avg_confidence,
+            "engine": "google_vision",
+            "word_count": len(full_text.split())
+        }
+        if include_detailed:
+            result["detailed_data"] = detailed_data
+        return result
+    
+    def _vision_image(self, image_path: str) -> vision.Image:
+        """
+        Build the Vision image for a local path or a Cloud Storage URI.
+        
+        Vision reads gs:// objects itself, so those are passed by reference
+        instead of being downloaded and uploaded through this service.
+        
+        Args:
+            image_path: Local path or gs:// URI of the image
             
-            avg_confidence = (sum(confidences) / len(confidences) * 100) if confidences else 95
-            
-            logger.info(
-                "Google Vision OCR completed",
-                image_path=image_path,
-                text_length=len(full_text),
-                avg_confidence=avg_confidence
-            )
-            
-            return {
-                "text": full_text.strip(),
-                "confidence": avg_confidence,
-                "engine": "google_vision",
-                "word_count": len(full_text.split()),
-                "detailed_data": detailed_data
-            }
+        Returns:
+            Vision image referencing or containing the image
+        """
+        if image_path.startswith("gs://"):
+            return vision.Image(source=vision.ImageSource(image_uri=image_path))
+        return vision.Image(content=self._encode_for_vision(image_path))
+    
+    def _encode_for_vision(self, image_path: str) -> bytes:
+        """
+        Read an image for upload to Vision, downscaling and re-encoding as needed.
+        
+        Args:
+            image_path: Path to the image file
             
-        except Exception as e:
-            logger.error("Google Vision OCR failed", error=str(e), image_path=image_path)
-            raise
+        Returns:
+            Image bytes; the original file if it is a JPEG within the size cap
+        """
+        with Image.open(image_path) as img:
+            if img.format == 'JPEG' and max(img.size) <= OCR_MAX_SIDE:
+                with open(image_path, 'rb') as image_file:
+                    return image_file.read()
+            
+            img.draft('RGB', (OCR_MAX_SIDE, OCR_MAX_SIDE))
+            img.thumbnail((OCR_MAX_SIDE, OCR_MAX_SIDE), Image.Resampling.LANCZOS)
+            rgb = img if img.mode == 'RGB' else img.convert('RGB')
+            buffer = io.BytesIO()
+            try:
+                rgb.save(buffer, format='JPEG', quality=VISION_JPEG_QUALITY, optimize=True)
+            finally:
+                if rgb is not img:
+                    rgb.close()
+        
+        return buffer.getvalue()
     
-    def extract_text(self, image_path: str) -> Dict[str, Any]:
+    def extract_text(
+        self,
+        image_path: str,
+        engine: Optional[str] = None,
+        include_detailed: bool = False
+    ) -> Dict[str, Any]:
         """
-        Extract text from image using the configured OCR engine.
+        Extract text from image using the requested or configured OCR engine.
+        
+        Per-word data is left out unless asked for; it is many times the
+        size of the text and nothing on the response path uses it.
         
         Args:
             image_path: Path to the image file
+            engine: OCR engine to use; defaults to the configured engine
+            include_detailed: Whether to include per-word data as detailed_data
             
         Returns:
             Dictionary containing extracted text and metadata
         """
+        engine = engine or self.ocr_engine
+        
         try:
-            logger.info("Starting OCR extraction", image_path=image_path, engine=self.ocr_engine)
+            logger.info("Starting OCR extraction", image_path=image_path, engine=engine)
             
-            if self.ocr_engine == "google_vision":
-                return self.extract_text_google_vision(image_path)
+            if engine == "google_vision":
+                return self.extract_text_google_vision(image_path, include_detailed)
+            elif engine == "tiered":
+                return self.extract_text_tiered(image_path, include_detailed=include_detailed)
             else:
-                return self.extract_text_tesseract(image_path)
+                return self.extract_text_tesseract(image_path, include_detailed)
                 
         except Exception as e:
             logger.error("OCR extraction failed", error=str(e), image_path=image_path)
             raise
     
+    def extract_text_tiered(
+        self,
+        image_path: str,
+        conf_threshold: float = TIERED_CONFIDENCE_THRESHOLD,
+        include_detailed: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Extract text with Tesseract, escalating to Google Vision on low confidence.
+        
+        Most flyers are read well enough by Tesseract; only the ones it
+        struggles with pay for a Vision request.
+        
+        Args:
+            image_path: Path to the image file
+            conf_threshold: Tesseract confidence below which Vision is tried
+            include_detailed: Whether to include per-word data as detailed_data
+            
+        Returns:
+            Whichever engine's result has the higher confidence
+        """
+        result = self.extract_text_tesseract(image_path, include_detailed)
+        
+        escalate = result["confidence"] < conf_threshold and self.vision_client is not None
+        escalation_rate = self._record_tiered(1, int(escalate))
+        if not escalate:
+            return result
+        
+        logger.info(
+            "Escalating OCR to Google Vision",
+            image_path=image_path,
+            tesseract_confidence=result["confidence"],
+            escalation_rate=escalation_rate
+        )
+        
+        try:
+            vision_result = self.extract_text_google_vision(image_path, include_detailed)
+        except Exception as e:
+            logger.warning("Vision escalation failed, keeping Tesseract result", error=str(e))
+            return result
+        
+        return vision_result if vision_result["confidence"] > result["confidence"] else result
+    
+    def _record_tiered(self, runs: int, escalations: int) -> float:
+        """Add to the tiered run counters and return the escalation rate so far."""
+        with self._tiered_lock:
+            self.tiered_runs += runs
+            self.tiered_escalations += escalations
+            return self.tiered_escalations / self.tiered_runs
+    
+    def _escalate_batch(
+        self,
+        image_paths: List[str],
+        results: List[Dict[str, Any]],
+        conf_threshold: float = TIERED_CONFIDENCE_THRESHOLD,
+        include_detailed: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Re-read a batch's low-confidence Tesseract results with batched Vision requests.
+        
+        Args:
+            image_paths: Paths to the image files
+            results: Tesseract results in the same order as image_paths
+            conf_threshold: Tesseract confidence below which Vision is tried
+            include_detailed: Whether to include per-word data as detailed_data
+            
+        Returns:
+            Per image, whichever engine's result has the higher confidence
+        """
+        low = [] if not self.vision_client else [
+            i for i, result in enumerate(results) if result["confidence"] < conf_threshold
+        ]
+        escalation_rate = self._record_tiered(len(results), len(low))
+        if not low:
+            return results
+        
+        logger.info(
+            "Escalating batch OCR to Google Vision",
+            images=len(low),
+            escalation_rate=escalation_rate
+        )
+        
+        try:
+            vision_results = self.extract_text_google_vision_batch(
+                [image_paths[i] for i in low], include_detailed
+            )
+        except Exception as e:
+            logger.warning("Vision escalation failed, keeping Tesseract results", error=str(e))
+            return results
+        
+        for i, vision_result in zip(low, vision_results):
+            if vision_result["confidence"] > results[i]["confidence"]:
+                results[i] = vision_result
+        return results
+    
+    def extract_text_batch(
+        self,
+        image_paths: List[str],
+        engine: Optional[str] = None,
+        include_detailed: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Extract text from several images, spreading Tesseract runs across processes.
+        
+        Each image is independent, so Tesseract scales with cores rather than
+        threads. Google Vision images go out in batched requests instead, as
+        do the low-confidence images of a tiered batch.
+        
+        Args:
+            image_paths: Paths to the image files
+            engine: OCR engine to use; defaults to the configured engine
+            include_detailed: Whether to include per-word data as detailed_data
+            
+        Returns:
+            Results in the same order as image_paths
+        """
+        engine = engine or self.ocr_engine
+        
+        if len(image_paths) < 2:
+            return [self.extract_text(path, engine, include_detailed) for path in image_paths]
+        
+        if engine == "google_vision":
+            return self.extract_text_google_vision_batch(image_paths, include_detailed)
+        
+        try:
+            logger.info("Starting batch OCR extraction", images=len(image_paths), engine=engine)
+            results = list(_get_batch_pool().map(
+                _tesseract_worker, image_paths, [include_detailed] * len(image_paths)
+            ))
+        except Exception as e:
+            logger.error("Batch OCR extraction failed", error=str(e), images=len(image_paths))
+            raise
+        
+        if engine == "tiered":
+            return self._escalate_batch(image_paths, results, include_detailed=include_detailed)
+        return results
+    
     def validate_image(self, image_path: str) -> bool:
         """
         Validate that the image file is readable and suitable for OCR.
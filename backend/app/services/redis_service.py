@@ -0,0 +1,190 @@
+"""
+Redis-backed counters for rate limiting (per-user daily quotas and
+sliding windows), and a result cache shared across instances and restarts.
+"""
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Optional, Tuple
+import orjson
+import structlog
+
+try:
+    import redis.asyncio as aioredis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    aioredis = None
+
+logger = structlog.get_logger(__name__)
+
+# Sliding window over a sorted set of request timestamps. Trimming, counting
+# and admitting happen in one atomic script, so concurrent requests can't
+# both take the last slot and rejected attempts never occupy one.
+_SLIDING_WINDOW_ACQUIRE = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count >= limit then
+    return {0, count}
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('EXPIRE', KEYS[1], math.ceil(window))
+return {1, count + 1}
+"""
+
+# Daily quota counter keyed by UTC day, the same window the Firestore quota
+# documents use. Over-limit increments are undone before returning, so
+# rejected attempts never hold a slot.
+_DAILY_COUNTER_ACQUIRE = """
+local count = redis.call('INCR', KEYS[1])
+if count > tonumber(ARGV[1]) then
+    redis.call('DECR', KEYS[1])
+    return {0, count - 1}
+end
+redis.call('EXPIREAT', KEYS[1], ARGV[2])
+return {1, count}
+"""
+
+# Decrement only while the day's key still exists, so a late release can't
+# leave a negative counter without an expiry behind
+_DAILY_COUNTER_RELEASE = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('DECR', KEYS[1])
+end
+return 0
+"""
+
+# Day keys outlive their day a little, so releases landing just after
+# midnight still find the counter they took from
+DAILY_KEY_GRACE_SECONDS = 60 * 60
+
+
+class AsyncRedisBackend:
+    """Atomic rate limit counters stored in Redis."""
+
+    def __init__(self, url: Optional[str] = None):
+        """
+        Initialize the Redis client.
+
+        Args:
+            url: Redis connection URL; defaults to the REDIS_URL env var
+        """
+        self.url = url or os.getenv("REDIS_URL")
+        self.client = None
+        self._acquire = None
+        self._acquire_daily = None
+        self._release_daily = None
+
+        if not REDIS_AVAILABLE:
+            logger.warning("redis package not available, falling back to Firestore rate limiting")
+            return
+
+        if not self.url:
+            logger.info("REDIS_URL not set, falling back to Firestore rate limiting")
+            return
+
+        try:
+            self.client = aioredis.from_url(self.url, decode_responses=True)
+            self._acquire = self.client.register_script(_SLIDING_WINDOW_ACQUIRE)
+            self._acquire_daily = self.client.register_script(_DAILY_COUNTER_ACQUIRE)
+            self._release_daily = self.client.register_script(_DAILY_COUNTER_RELEASE)
+            logger.info("Redis rate limit backend initialized")
+        except Exception as e:
+            logger.error("Failed to initialize Redis", error=str(e))
+            self.client = None
+
+    @property
+    def is_available(self) -> bool:
+        """Check if Redis is configured."""
+        return self.client is not None
+
+    async def acquire(self, key: str, limit: int, window_seconds: float) -> Tuple[bool, int]:
+        """
+        Take one slot in a sliding window if any are free.
+
+        Args:
+            key: Full Redis key of the window; callers namespace their own
+            limit: Maximum requests per window
+            window_seconds: Window length in seconds
+
+        Returns:
+            Tuple of (is_allowed, requests in the window including this one
+            if it was allowed)
+        """
+        allowed, count = await self._acquire(
+            keys=[key],
+            args=[time.time(), window_seconds, limit, uuid.uuid4().hex]
+        )
+        return bool(allowed), int(count)
+
+    def _day_key(self, user_id: str, now: datetime) -> str:
+        return f"rl:{user_id}:{now.strftime('%Y-%m-%d')}"
+
+    async def acquire_daily(
+        self,
+        user_id: str,
+        limit: int,
+        now: datetime,
+        reset_at: datetime
+    ) -> Tuple[bool, int]:
+        """
+        Take one of a user's analyses for the UTC day of `now` if any are left.
+
+        Args:
+            user_id: User ID
+            limit: Maximum requests per day
+            now: Time of the request (naive UTC)
+            reset_at: When the day's quota resets (naive UTC)
+
+        Returns:
+            Tuple of (is_allowed, requests that day including this one if
+            it was allowed)
+        """
+        expire_at = int((reset_at - datetime(1970, 1, 1)).total_seconds()) + DAILY_KEY_GRACE_SECONDS
+        allowed, count = await self._acquire_daily(
+            keys=[self._day_key(user_id, now)],
+            args=[limit, expire_at]
+        )
+        return bool(allowed), int(count)
+
+    async def release_daily(self, user_id: str, now: datetime) -> None:
+        """
+        Give back an analysis taken by acquire_daily.
+
+        Args:
+            user_id: User ID
+            now: The `now` the analysis was taken at
+        """
+        await self._release_daily(keys=[self._day_key(user_id, now)])
+
+    async def get_cached(self, key: str) -> Optional[Any]:
+        """
+        Get a cached JSON value.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Decoded value, or None on a miss
+        """
+        raw = await self.client.get(f"cache:{key}")
+        return orjson.loads(raw) if raw is not None else None
+
+    async def set_cached(self, key: str, value: Any, ttl_seconds: int) -> None:
+        """
+        Cache a JSON-serializable value.
+
+        Args:
+            key: Cache key
+            value: Value to store
+            ttl_seconds: Time to live in seconds
+        """
+        await self.client.set(f"cache:{key}", orjson.dumps(value), ex=ttl_seconds)
+
+
+# Global instance
+redis_backend = AsyncRedisBackend()
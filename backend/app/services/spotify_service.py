@@ -1,8 +1,12 @@
 import os
 import asyncio
 from typing import List, Dict, Any, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials, SpotifyOAuth
+from spotipy.cache_handler import MemoryCacheHandler
 import structlog
 
 logger = structlog.get_logger(__name__)
@@ -11,6 +15,16 @@ logger = structlog.get_logger(__name__)
 class SpotifyService:
     """Service for interacting with Spotify API."""
     
+    # Concurrent artist lookups per playlist build; kept low to avoid 429s
+    MAX_CONCURRENT_LOOKUPS = 5
+    # Concurrent add-items requests against one playlist
+    MAX_CONCURRENT_TRACK_BATCHES = 3
+    
+    # Connections kept alive to api.spotify.com / accounts.spotify.com
+    HTTP_POOL_SIZE = 20
+    
+    OAUTH_SCOPE = "playlist-modify-public playlist-modify-private"
+    
     def __init__(self):
         self.client_id = os.getenv("SPOTIFY_CLIENT_ID")
         self.client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
@@ -18,17 +32,35 @@ class SpotifyService:
 
         self.client_credentials_manager = None
         self.sp_public = None
+        self.oauth = None
         self.is_configured = False
+        # Shared by every spotipy client we build, so user-scoped clients
+        # reuse warm TLS connections instead of opening their own
+        self.session = self._build_session()
 
         if self.client_id and self.client_secret:
             try:
                 self.client_credentials_manager = SpotifyClientCredentials(
                     client_id=self.client_id,
-                    client_secret=self.client_secret
+                    client_secret=self.client_secret,
+                    requests_session=self.session
                 )
 
                 self.sp_public = spotipy.Spotify(
-                    client_credentials_manager=self.client_credentials_manager
+                    client_credentials_manager=self.client_credentials_manager,
+                    requests_session=self.session
+                )
+                
+                # Shared by every user's OAuth flow. The memory cache handler
+                # keeps tokens off disk, and token lookups skip the cache so
+                # one user's token is never returned to another.
+                self.oauth = SpotifyOAuth(
+                    client_id=self.client_id,
+                    client_secret=self.client_secret,
+                    redirect_uri=self.redirect_uri,
+                    scope=self.OAUTH_SCOPE,
+                    cache_handler=MemoryCacheHandler(),
+                    requests_session=self.session
                 )
 
                 self.is_configured = True
@@ -38,6 +70,34 @@ class SpotifyService:
         else:
             logger.warning("Spotify credentials not configured - Spotify features will be disabled")
     
+    def _build_session(self) -> requests.Session:
+        """
+        Build the pooled HTTP session shared by all Spotify clients.
+        
+        Mirrors the retry policy spotipy applies to the sessions it builds
+        itself, since passing our own session bypasses it.
+        
+        Returns:
+            Configured requests session
+        """
+        retry = Retry(
+            total=3,
+            connect=None,
+            read=False,
+            allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+            status=3,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504)
+        )
+        adapter = HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=self.HTTP_POOL_SIZE,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        return session
+    
     def get_user_spotify_client(self, access_token: str) -> spotipy.Spotify:
         """
         Get Spotify client with user authentication.
@@ -48,7 +108,7 @@ class SpotifyService:
         Returns:
             Authenticated Spotify client
         """
-        return spotipy.Spotify(auth=access_token)
+        return spotipy.Spotify(auth=access_token, requests_session=self.session)
     
     def get_auth_url(self, state: str = None) -> str:
         """
@@ -60,17 +120,7 @@ class SpotifyService:
         Returns:
             Authorization URL
         """
-        scope = "playlist-modify-public playlist-modify-private"
-
-        auth_manager = SpotifyOAuth(
-            client_id=self.client_id,
-            client_secret=self.client_secret,
-            redirect_uri=self.redirect_uri,
-            scope=scope,
-            state=state
-        )
-
-        return auth_manager.get_authorize_url()
+        return self.oauth.get_authorize_url(state=state)
 
     def exchange_code_for_token(self, authorization_code: str, state: str = None) -> Optional[Dict[str, Any]]:
         """
@@ -84,17 +134,7 @@ class SpotifyService:
             Token information including access_token, refresh_token, expires_in, etc.
         """
         try:
-            scope = "playlist-modify-public playlist-modify-private"
-
-            auth_manager = SpotifyOAuth(
-                client_id=self.client_id,
-                client_secret=self.client_secret,
-                redirect_uri=self.redirect_uri,
-                scope=scope,
-                state=state
-            )
-
-            token_info = auth_manager.get_access_token(authorization_code)
+            token_info = self.oauth.get_access_token(authorization_code, check_cache=False)
 
             if token_info:
                 logger.info("Successfully exchanged authorization code for access token")
@@ -154,7 +194,8 @@ class SpotifyService:
         try:
             cleaned_name = artist_name.strip().replace("&", "and")
             
-            results = self.sp_public.search(
+            results = await asyncio.to_thread(
+                self.sp_public.search,
                 q=f'artist:"{cleaned_name}"',
                 type='artist',
                 limit=10
@@ -163,7 +204,8 @@ class SpotifyService:
             artists = results['artists']['items']
             
             if not artists:
-                results = self.sp_public.search(
+                results = await asyncio.to_thread(
+                    self.sp_public.search,
                     q=cleaned_name,
                     type='artist',
                     limit=10
@@ -173,12 +215,18 @@ class SpotifyService:
             if artists:
                 best_match = None
                 best_score = 0
+                # Normalized once for all candidates
+                search_lower = artist_name.lower().strip()
+                search_words = set(search_lower.split())
                 
                 for artist in artists:
-                    score = self.calculate_artist_match_score(artist_name, artist['name'])
+                    score = self._match_score(search_lower, search_words, artist['name'])
                     if score > best_score:
                         best_score = score
                         best_match = artist
+                        if score == 1.0:
+                            # Nothing can beat an exact match
+                            break
                 
                 if best_match and best_score > 0.7:
                     logger.info(
@@ -217,6 +265,11 @@ class SpotifyService:
             Similarity score between 0 and 1
         """
         search_lower = search_name.lower().strip()
+        return self._match_score(search_lower, set(search_lower.split()), found_name)
+    
+    @staticmethod
+    def _match_score(search_lower: str, search_words: set, found_name: str) -> float:
+        """Score found_name against an already-normalized search name."""
         found_lower = found_name.lower().strip()
         
         if search_lower == found_lower:
@@ -225,7 +278,6 @@ class SpotifyService:
         if search_lower in found_lower or found_lower in search_lower:
             return 0.9
         
-        search_words = set(search_lower.split())
         found_words = set(found_lower.split())
         
         if not search_words or not found_words:
@@ -248,7 +300,9 @@ class SpotifyService:
             List of track information
         """
         try:
-            results = self.sp_public.artist_top_tracks(artist_id, country='US')
+            results = await asyncio.to_thread(
+                self.sp_public.artist_top_tracks, artist_id, country='US'
+            )
             tracks = results['tracks'][:limit]
             
             track_list = []
@@ -301,7 +355,8 @@ class SpotifyService:
             
             sp_user = self.get_user_spotify_client(access_token)
             
-            playlist = sp_user.user_playlist_create(
+            playlist = await asyncio.to_thread(
+                sp_user.user_playlist_create,
                 user=user_id,
                 name=playlist_name,
                 public=public,
@@ -346,20 +401,21 @@ class SpotifyService:
             
             sp_user = self.get_user_spotify_client(access_token)
             
+            # Spotify takes at most 100 tracks per request. Batches are sent
+            # concurrently, so their order within the playlist isn't fixed.
             batch_size = 100
+            semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_TRACK_BATCHES)
+            track_uris = [f"spotify:track:{track_id}" for track_id in track_ids]
             
-            for i in range(0, len(track_ids), batch_size):
-                batch = track_ids[i:i + batch_size]
-                track_uris = [f"spotify:track:{track_id}" for track_id in batch]
-                
-                sp_user.playlist_add_items(playlist_id, track_uris)
-                
-                logger.info(
-                    "Added tracks to playlist",
-                    playlist_id=playlist_id,
-                    batch_size=len(batch),
-                    total_added=min(i + batch_size, len(track_ids))
-                )
+            async def add_batch(batch: List[str]) -> None:
+                async with semaphore:
+                    await asyncio.to_thread(sp_user.playlist_add_items, playlist_id, batch)
+                logger.info("Added tracks to playlist", playlist_id=playlist_id, batch_size=len(batch))
+            
+            await asyncio.gather(*(
+                add_batch(track_uris[i:i + batch_size])
+                for i in range(0, len(track_uris), batch_size)
+            ))
             
             return True
             
@@ -401,15 +457,37 @@ class SpotifyService:
             failed_artists = []
             all_tracks = []
             
-            for artist_name in artist_names:
-                artist_info = await self.search_artist(artist_name)
-                
-                if artist_info:
+            semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_LOOKUPS)
+            
+            async def lookup(artist_name: str) -> Tuple[Optional[Dict[str, Any]], List[Dict[str, Any]]]:
+                async with semaphore:
+                    artist_info = await self.search_artist(artist_name)
+                    if not artist_info:
+                        return None, []
                     tracks = await self.get_artist_top_tracks(
                         artist_info['id'],
                         limit=tracks_per_artist
                     )
-                    
+                    return artist_info, tracks
+            
+            # A name listed twice in a lineup is looked up once
+            unique_names = list(dict.fromkeys(artist_names))
+            unique_results = await asyncio.gather(
+                *(lookup(artist_name) for artist_name in unique_names),
+                return_exceptions=True
+            )
+            by_name = dict(zip(unique_names, unique_results))
+            results = [by_name[artist_name] for artist_name in artist_names]
+            
+            for artist_name, result in zip(artist_names, results):
+                if isinstance(result, Exception):
+                    failed_artists.append(artist_name)
+                    logger.warning("Artist lookup failed", artist_name=artist_name, error=str(result))
+                    continue
+                
+                artist_info, tracks = result
+                
+                if artist_info:
                     if tracks:
                         all_tracks.extend(tracks)
                         successful_artists.append(artist_name)
@@ -5,14 +5,17 @@ from .file_utils import (
     validate_file_size,
     get_upload_path,
     calculate_file_hash,
+    hash_files_batch,
     cleanup_old_files,
     ensure_upload_directory,
 )
 
+from .text_utils import normalize_name
+
+from .responses import ORJSONResponse
+
 from .middleware import (
-    rate_limit_middleware,
-    request_size_middleware,
-    security_headers_middleware,
+    UnifiedMiddleware,
     request_logging_middleware,
 )
 
@@ -23,10 +26,11 @@ __all__ = [
     "validate_file_size",
     "get_upload_path",
     "calculate_file_hash",
+    "hash_files_batch",
     "cleanup_old_files",
     "ensure_upload_directory",
-    "rate_limit_middleware",
-    "request_size_middleware",
-    "security_headers_middleware",
+    "normalize_name",
+    "ORJSONResponse",
+    "UnifiedMiddleware",
     "request_logging_middleware",
 ]
@@ -0,0 +1,19 @@
+"""
+JSON response class serialized with orjson.
+"""
+from typing import Any
+import orjson
+from starlette.responses import JSONResponse
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered by orjson.
+    
+    Kept local because FastAPI deprecated its own ORJSONResponse; the
+    options match it, so datetimes, numpy values and non-string keys
+    serialize the same way.
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
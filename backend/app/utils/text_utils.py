@@ -0,0 +1,20 @@
+from functools import lru_cache
+
+
+@lru_cache(maxsize=8192)
+def normalize_name(name: str) -> str:
+    """
+    Normalize an artist name or text segment for comparison.
+    
+    Case-folds and collapses whitespace so "DJ  Snake" and "dj snake"
+    compare equal. Festival line-ups repeat the same names across
+    requests, so results are memoized.
+    
+    Args:
+        name: Raw name or text
+        
+    Returns:
+        Normalized string
+    """
+    return " ".join(name.casefold().split())
+
@@ -5,15 +5,30 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+
 if __name__ == "__main__":
     # Configure uvicorn with appropriate timeouts for long-running requests
-    uvicorn.run(
-        "app.main:app",
+    options = dict(
         host="0.0.0.0",
         port=8000,
-        reload=True,
         timeout_keep_alive=600,
         timeout_graceful_shutdown=30,
         access_log=True,
         log_level="info"
     )
+
+    if DEBUG:
+        uvicorn.run("app.main:app", reload=True, **options)
+    else:
+        # One process per core so OCR and hashing aren't serialized on one
+        # GIL; uvloop and httptools come with uvicorn[standard]
+        uvicorn.run(
+            "app.main:app",
+            workers=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+            loop="uvloop",
+            http="httptools",
+            backlog=2048,
+            limit_concurrency=1000,
+            **options
+        )
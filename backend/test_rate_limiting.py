@@ -101,8 +101,9 @@ def test_firestore_availability():
     print("=" * 60)
     
     try:
-        from app.services.firebase_service import firebase_service
+        from app.services.firebase_service import get_firebase_service
         
+        firebase_service = get_firebase_service()
         print(f"\n✅ Firebase service imported successfully")
         print(f"   Is available: {firebase_service.is_available}")
         
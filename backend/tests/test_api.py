@@ -1,11 +1,22 @@
 import pytest
 import tempfile
 import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 from fastapi.testclient import TestClient
 from PIL import Image
 import io
 
+from google.cloud import vision
+
 from app.main import app
+from app.api import endpoints as endpoints_module
+from app.services import ocr_service as ocr_module
+from app.services.ocr_service import OCRService
+from app.services.gemini_service import GeminiService
+from app.utils.file_utils import hash_files_batch
+from app.utils.middleware import RateLimitMiddleware, rate_limiter
 
 client = TestClient(app)
 
@@ -31,6 +42,49 @@ def create_test_image(width=800, height=600, format="JPEG"):
     return img_bytes
 
 
+@pytest.fixture(scope="session")
+def test_image_bytes():
+    """Encoded test image, built once per session."""
+    return create_test_image().getvalue()
+
+
+@pytest.fixture(scope="session")
+def large_test_image_bytes():
+    """Encoded 5000x5000 test image, built once per session."""
+    return create_test_image(width=5000, height=5000).getvalue()
+
+
+@pytest.fixture
+def thread_pool():
+    """Thread pool standing in for the OCR process pool, so patches apply."""
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        yield pool
+
+
+@pytest.fixture
+def local_rate_limiter():
+    """Builds in-memory IP rate limiters with the Redis backend switched off."""
+    def build(requests_per_minute=3, max_ips=16_384):
+        return RateLimitMiddleware(
+            requests_per_minute=requests_per_minute,
+            backend=mock.Mock(is_available=False),
+            max_ips=max_ips
+        )
+    return build
+
+
+def fake_tesseract(confidences):
+    """Stand-in for OCRService.extract_text_tesseract returning fixed confidences."""
+    def extract_text_tesseract(self, image_path, include_detailed=False):
+        return {
+            "text": image_path,
+            "confidence": confidences[image_path],
+            "engine": "tesseract",
+            "word_count": 1
+        }
+    return extract_text_tesseract
+
+
 class TestHealthEndpoint:
     """Test health check endpoint."""
     
@@ -43,6 +97,14 @@ class TestHealthEndpoint:
         assert data["status"] == "healthy"
         assert data["service"] == "festlist-api"
         assert "timestamp" in data
+    
+    def test_health_check_skips_rate_limit(self):
+        """Health checks are neither limited nor counted against the caller's IP."""
+        with mock.patch.object(rate_limiter, "is_allowed", mock.AsyncMock(return_value=False)) as is_allowed:
+            response = client.get("/api/v1/health")
+        
+        assert response.status_code == 200
+        is_allowed.assert_not_called()
 
 
 class TestRootEndpoint:
@@ -62,9 +124,16 @@ class TestRootEndpoint:
 class TestFileUpload:
     """Test file upload functionality."""
     
-    def test_upload_valid_image(self):
+    @pytest.fixture(autouse=True)
+    def upload_dir(self, tmp_path, monkeypatch):
+        """Write uploads to a temporary directory instead of the source tree."""
+        monkeypatch.setenv("UPLOAD_DIR", str(tmp_path))
+        monkeypatch.setattr(app.state, "upload_dir", str(tmp_path))
+        return tmp_path
+    
+    def test_upload_valid_image(self, test_image_bytes):
         """Test uploading a valid image file."""
-        test_image = create_test_image()
+        test_image = io.BytesIO(test_image_bytes)
         
         response = client.post(
             "/api/v1/upload",
@@ -97,10 +166,41 @@ class TestFileUpload:
         assert response.status_code == 400
         assert "Invalid file type" in response.json()["error"]
     
-    def test_upload_large_file(self):
+    def test_upload_non_image_claiming_jpeg(self):
+        """Test that the declared MIME type doesn't get a non-image through."""
+        response = client.post(
+            "/api/v1/upload",
+            files={"file": ("flyer.jpg", io.BytesIO(b"<html>not an image</html>"), "image/jpeg")}
+        )
+        
+        assert response.status_code == 400
+        assert "Invalid file type" in response.json()["error"]
+    
+    def test_upload_png_named_jpg(self):
+        """Test that any accepted image format passes whatever its extension."""
+        png_image = create_test_image(format="PNG")
+        
+        response = client.post(
+            "/api/v1/upload",
+            files={"file": ("flyer.jpg", png_image, "image/jpeg")}
+        )
+        
+        assert response.status_code == 200
+        assert response.json()["filename"] == "flyer.jpg"
+    
+    def test_upload_empty_file(self):
+        """Test upload of an empty file."""
+        response = client.post(
+            "/api/v1/upload",
+            files={"file": ("empty.jpg", io.BytesIO(b""), "image/jpeg")}
+        )
+        
+        assert response.status_code == 400
+    
+    def test_upload_large_file(self, large_test_image_bytes):
         """Test upload with file that's too large."""
         # Create a large image (this is a simulation - actual large file would be huge)
-        large_image = create_test_image(width=5000, height=5000)
+        large_image = io.BytesIO(large_test_image_bytes)
         
         response = client.post(
             "/api/v1/upload",
@@ -168,6 +268,35 @@ class TestArtistExtraction:
         assert "total_found" in data
         assert data["total_found"] >= 0
     
+    def test_extract_artists_repeated_text_is_stable(self):
+        """Test that repeating a request returns the same artists."""
+        payload = {
+            "text": "Daft Punk\nMUSIC\nDaft Punk\n",
+            "use_ai": False,
+            "confidence_threshold": 0.5
+        }
+        
+        first = client.post("/api/v1/extract-artists", json=payload)
+        second = client.post("/api/v1/extract-artists", json=payload)
+        
+        assert first.status_code == 200
+        assert second.status_code == 200
+        assert first.json()["artists"] == second.json()["artists"]
+    
+    def test_extract_artists_independent_of_cache_history(self):
+        """Test that earlier requests for part of a text don't change its scores."""
+        full = {"text": "Daft Punk\nJustice\nDaft Punk\n", "use_ai": False, "confidence_threshold": 0.0}
+        part = {"text": "Daft Punk\n", "use_ai": False, "confidence_threshold": 0.0}
+        
+        endpoints_module._EXTRACTION_CACHE.clear()
+        cold = client.post("/api/v1/extract-artists", json=full).json()["artists"]
+        
+        endpoints_module._EXTRACTION_CACHE.clear()
+        client.post("/api/v1/extract-artists", json=part)
+        warm = client.post("/api/v1/extract-artists", json=full).json()["artists"]
+        
+        assert warm == cold
+    
     def test_extract_artists_empty_text(self):
         """Test artist extraction with empty text."""
         response = client.post(
@@ -258,6 +387,305 @@ class TestErrorHandling:
         """Test using wrong HTTP method."""
         response = client.get("/api/v1/upload")  # Should be POST
         assert response.status_code == 405
+    
+    def test_malformed_content_length(self):
+        """Test that a non-numeric Content-Length is rejected, not a server error."""
+        response = client.post(
+            "/api/v1/extract-artists",
+            content=b"{}",
+            headers={"Content-Length": "abc", "Content-Type": "application/json"}
+        )
+        assert response.status_code == 400
+
+
+class TestTieredBatchOCR:
+    """Test tiered escalation of batched OCR."""
+    
+    def test_low_confidence_images_escalate_in_one_vision_batch(self, thread_pool):
+        """Only images below the threshold go to Vision, in a single batch call."""
+        confidences = {"a.png": 90.0, "b.png": 20.0, "c.png": 40.0}
+        vision_results = [
+            {"text": "B", "confidence": 95.0, "engine": "google_vision", "word_count": 1},
+            {"text": "C", "confidence": 30.0, "engine": "google_vision", "word_count": 1},
+        ]
+        service = OCRService(engine="tesseract")
+        service.vision_client = mock.Mock()
+        
+        with mock.patch.object(OCRService, "extract_text_tesseract", fake_tesseract(confidences)), \
+                mock.patch.object(ocr_module, "_get_batch_pool", return_value=thread_pool), \
+                mock.patch.object(service, "extract_text_google_vision_batch",
+                                  return_value=vision_results) as vision_batch:
+            results = service.extract_text_batch(list(confidences), engine="tiered")
+        
+        vision_batch.assert_called_once_with(["b.png", "c.png"], False)
+        # Vision only replaces a result it beats
+        assert [r["engine"] for r in results] == ["tesseract", "google_vision", "tesseract"]
+        assert (service.tiered_runs, service.tiered_escalations) == (3, 2)
+    
+    def test_no_escalation_without_vision_client(self, thread_pool):
+        """Without a Vision client the Tesseract results are returned as is."""
+        confidences = {"a.png": 10.0, "b.png": 20.0}
+        service = OCRService(engine="tesseract")
+        
+        with mock.patch.object(OCRService, "extract_text_tesseract", fake_tesseract(confidences)), \
+                mock.patch.object(ocr_module, "_get_batch_pool", return_value=thread_pool):
+            results = service.extract_text_batch(list(confidences), engine="tiered")
+        
+        assert [r["text"] for r in results] == ["a.png", "b.png"]
+        assert (service.tiered_runs, service.tiered_escalations) == (2, 0)
+
+
+class TestBatchOCR:
+    """Test batched Tesseract OCR across the worker pool."""
+    
+    def test_batch_preserves_order_through_workers(self, thread_pool):
+        """Results come back in input order from Tesseract-only workers."""
+        paths = [f"flyer_{i}.png" for i in range(6)]
+        confidences = {path: 80.0 for path in paths}
+        
+        with mock.patch.object(OCRService, "extract_text_tesseract", fake_tesseract(confidences)), \
+                mock.patch.object(ocr_module, "_get_batch_pool", return_value=thread_pool), \
+                mock.patch.object(ocr_module, "_worker_service", None):
+            results = OCRService(engine="tesseract").extract_text_batch(paths)
+            worker_service = ocr_module._worker_service
+        
+        assert [r["text"] for r in results] == paths
+        assert worker_service.ocr_engine == "tesseract"
+        assert worker_service.vision_client is None
+    
+    def test_single_image_skips_pool(self):
+        """A one-image batch runs in-process without starting the pool."""
+        service = OCRService(engine="tesseract")
+        
+        with mock.patch.object(OCRService, "extract_text_tesseract",
+                               fake_tesseract({"a.png": 80.0})), \
+                mock.patch.object(ocr_module, "_get_batch_pool") as get_pool:
+            results = service.extract_text_batch(["a.png"])
+        
+        get_pool.assert_not_called()
+        assert [r["text"] for r in results] == ["a.png"]
+    
+    def test_batch_pool_is_spawned_once(self):
+        """The pool is created lazily, once, with the spawn start method."""
+        with mock.patch.object(ocr_module, "_batch_pool", None), \
+                mock.patch.object(ocr_module, "ProcessPoolExecutor") as pool_class:
+            first = ocr_module._get_batch_pool()
+            second = ocr_module._get_batch_pool()
+        
+        assert first is second
+        pool_class.assert_called_once()
+        assert pool_class.call_args.kwargs["mp_context"].get_start_method() == "spawn"
+
+
+class TestVisionBatchOCR:
+    """Test batched Google Vision OCR."""
+    
+    def test_batches_of_sixteen_keep_order(self):
+        """20 images take two requests (16 + 4) and map back in input order."""
+        paths = [f"flyer_{i}.jpg" for i in range(20)]
+        
+        def batch_annotate_images(requests):
+            return vision.BatchAnnotateImagesResponse(responses=[
+                vision.AnnotateImageResponse(text_annotations=[
+                    vision.EntityAnnotation(description=request.image.content.decode())
+                ])
+                for request in requests
+            ])
+        
+        service = OCRService(engine="tesseract")
+        service.vision_client = mock.Mock()
+        service.vision_client.batch_annotate_images.side_effect = batch_annotate_images
+        
+        with mock.patch.object(service, "_vision_image",
+                               lambda path: vision.Image(content=path.encode())):
+            results = service.extract_text_google_vision_batch(paths)
+        
+        chunk_sizes = [
+            len(call.kwargs["requests"])
+            for call in service.vision_client.batch_annotate_images.call_args_list
+        ]
+        assert chunk_sizes == [16, 4]
+        assert [r["text"] for r in results] == paths
+        assert all(r["engine"] == "google_vision" for r in results)
+    
+    def test_batch_requires_vision_client(self):
+        """Without a Vision client the batch fails instead of returning nothing."""
+        with pytest.raises(ValueError):
+            OCRService(engine="tesseract").extract_text_google_vision_batch(["a.jpg", "b.jpg"])
+
+
+class TestFileHashing:
+    """Test parallel file hashing."""
+    
+    def test_hash_files_batch_matches_sha256_in_order(self, tmp_path):
+        """Hashes match hashlib's and come back in input order."""
+        contents = [b"", b"flyer", os.urandom(200 * 1024), b"lineup" * 1000]
+        paths = []
+        for i, content in enumerate(contents):
+            path = tmp_path / f"file_{i}.bin"
+            path.write_bytes(content)
+            paths.append(str(path))
+        
+        assert hash_files_batch(paths) == [hashlib.sha256(c).hexdigest() for c in contents]
+    
+    def test_hash_files_batch_missing_file_raises(self, tmp_path):
+        """A missing file fails the batch rather than being skipped."""
+        existing = tmp_path / "present.bin"
+        existing.write_bytes(b"flyer")
+        
+        with pytest.raises(FileNotFoundError):
+            hash_files_batch([str(existing), str(tmp_path / "missing.bin")])
+
+
+class TestLocalRateLimiter:
+    """Test the in-memory per-IP rate limiter."""
+    
+    def test_limit_within_window(self, local_rate_limiter):
+        """Requests past the limit are denied until the window has passed."""
+        limiter = local_rate_limiter()
+        
+        with mock.patch("app.utils.middleware.time.monotonic") as monotonic:
+            monotonic.return_value = 1000
+            assert [limiter._is_allowed_local("1.2.3.4") for _ in range(4)] == [True, True, True, False]
+            monotonic.return_value = 1059
+            assert not limiter._is_allowed_local("1.2.3.4")
+            monotonic.return_value = 1060
+            assert limiter._is_allowed_local("1.2.3.4")
+    
+    def test_window_slides_per_second(self, local_rate_limiter):
+        """Only the seconds that left the window are freed, across the ring's wrap."""
+        limiter = local_rate_limiter()
+        
+        with mock.patch("app.utils.middleware.time.monotonic") as monotonic:
+            # Second 1015 is the ring's bucket 55; clearing up to 1025
+            # wraps past the end of the ring
+            monotonic.return_value = 1015
+            assert limiter._is_allowed_local("1.2.3.4")
+            assert limiter._is_allowed_local("1.2.3.4")
+            monotonic.return_value = 1025
+            assert limiter._is_allowed_local("1.2.3.4")
+            monotonic.return_value = 1074
+            assert not limiter._is_allowed_local("1.2.3.4")
+            # The two requests from second 1015 have expired; 1025's hasn't
+            monotonic.return_value = 1075
+            assert limiter._is_allowed_local("1.2.3.4")
+            assert limiter._is_allowed_local("1.2.3.4")
+            assert not limiter._is_allowed_local("1.2.3.4")
+    
+    def test_ips_are_limited_independently(self, local_rate_limiter):
+        """One client using up its limit doesn't affect another."""
+        limiter = local_rate_limiter(requests_per_minute=1)
+        
+        assert limiter._is_allowed_local("1.2.3.4")
+        assert not limiter._is_allowed_local("1.2.3.4")
+        assert limiter._is_allowed_local("5.6.7.8")
+    
+    def test_table_is_capped(self, local_rate_limiter):
+        """The oldest IP is evicted once max_ips are tracked."""
+        limiter = local_rate_limiter(max_ips=2)
+        
+        for ip in ("1.1.1.1", "2.2.2.2", "3.3.3.3"):
+            limiter._is_allowed_local(ip)
+        
+        assert list(limiter.requests) == ["2.2.2.2", "3.3.3.3"]
+    
+    def test_eviction_follows_recency(self, local_rate_limiter):
+        """A request refreshes an IP's position, so the least recently seen goes first."""
+        limiter = local_rate_limiter(max_ips=2)
+        
+        for ip in ("1.1.1.1", "2.2.2.2", "1.1.1.1", "3.3.3.3"):
+            limiter._is_allowed_local(ip)
+        
+        assert list(limiter.requests) == ["1.1.1.1", "3.3.3.3"]
+
+
+class TestTesseractTSV:
+    """Test parsing of tesserocr's TSV word table."""
+    
+    def test_parse_matches_pytesseract_layout(self):
+        """Rows become pytesseract's Output.DICT column lists."""
+        tsv = (
+            "1\t1\t0\t0\t0\t0\t0\t0\t800\t600\t-1\t\n"
+            "5\t1\t1\t1\t1\t1\t100\t100\t200\t50\t91.5\tHeadliner\n"
+            "5\t1\t1\t1\t1\t2\t320\t100\t80\t50\t47\tDJ Set\n"
+        )
+        
+        data = OCRService._parse_tesseract_tsv(tsv)
+        
+        assert data["level"] == [1, 5, 5]
+        assert data["left"] == [0, 100, 320]
+        assert data["conf"] == [-1.0, 91.5, 47.0]
+        assert data["text"] == ["", "Headliner", "DJ Set"]
+        assert all(len(column) == 3 for column in data.values())
+    
+    def test_parse_skips_short_rows(self):
+        """Truncated rows and blank lines are ignored."""
+        tsv = "5\t1\t1\t1\t1\t1\t100\t100\t200\t50\t91\tLineup\n\n5\t1\t1\n"
+        
+        data = OCRService._parse_tesseract_tsv(tsv)
+        
+        assert data["text"] == ["Lineup"]
+        assert data["word_num"] == [1]
+
+
+
+class FakeChunk:
+    """Streamed Gemini chunk; text raises like the SDK's when there are no parts."""
+    
+    def __init__(self, text):
+        self._text = text
+    
+    @property
+    def text(self):
+        if self._text is None:
+            raise ValueError("no parts")
+        return self._text
+
+
+class FakeStream:
+    """Streamed Gemini response recording how far it was read."""
+    
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.read = 0
+        self.closed = False
+    
+    async def _chunks(self):
+        try:
+            for piece in self.pieces:
+                self.read += 1
+                yield FakeChunk(piece)
+        finally:
+            self.closed = True
+    
+    def __aiter__(self):
+        return self._chunks()
+
+
+class TestGeminiStreaming:
+    """Test reading a streamed Gemini JSON array."""
+    
+    async def stream_json_array(self, pieces):
+        service = GeminiService()
+        stream = FakeStream(pieces)
+        service.model = mock.Mock(generate_content_async=mock.AsyncMock(return_value=stream))
+        return await service._stream_json_array("prompt"), stream
+    
+    async def test_stops_once_the_array_closes(self):
+        """Reading stops at the closing bracket and the stream is closed."""
+        text, stream = await self.stream_json_array(
+            ['```json\n[{"name": "A]"', ', "confidence": 0.9}', ', {"name": "B"}]', '\n```', ' trailing']
+        )
+        
+        assert text == '```json\n[{"name": "A]", "confidence": 0.9}, {"name": "B"}]'
+        assert stream.read == 3
+        assert stream.closed
+    
+    async def test_chunks_without_text_are_skipped(self):
+        """A chunk with no parts doesn't discard the rest of the response."""
+        text, _ = await self.stream_json_array([None, '[{"name": "A"}', None, ']'])
+        
+        assert text == '[{"name": "A"}]'
 
 
 if __name__ == "__main__":
@@ -1,54 +1,104 @@
 import os
+import time
+import asyncio
+import importlib.util
+from contextlib import asynccontextmanager
 import httpx
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 
 # --- Pydantic Models for Data Validation ---
 class ArtistSearchRequest(BaseModel):
     artist_name: str
 
+class ArtistBatchSearchRequest(BaseModel):
+    artist_names: list[str]
+
 # This can be expanded to define the expected response structure for better type hinting and documentation
 
+# --- Shared HTTP Client ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Keeps one pooled client open for the app's lifetime so searches reuse warm TLS connections."""
+    app.state.http = httpx.AsyncClient(
+        # HTTP/2 multiplexes concurrent searches over one connection when h2 is installed
+        http2=importlib.util.find_spec("h2") is not None,
+        timeout=10.0,
+        limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=300)
+    )
+    try:
+        yield
+    finally:
+        await app.state.http.aclose()
+
 # --- FastAPI App Initialization ---
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 SPOTIFY_CLIENT_ID = os.environ.get("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.environ.get("SPOTIFY_CLIENT_SECRET")
 
-async def get_spotify_token():
-    """Authenticates with Spotify and returns an access token asynchronously."""
+# Client-credentials tokens last about an hour; one is shared by all requests
+# and refreshed shortly before it expires
+TOKEN_REFRESH_MARGIN_SECONDS = 30
+_token_cache = {"access_token": None, "expires_at": 0.0}
+_token_lock = asyncio.Lock()
+
+async def get_spotify_token(client: httpx.AsyncClient):
+    """Returns a cached Spotify access token, fetching a new one when it is about to expire."""
+    if time.monotonic() < _token_cache["expires_at"] - TOKEN_REFRESH_MARGIN_SECONDS:
+        return _token_cache["access_token"]
+
+    async with _token_lock:
+        # Another request may have refreshed it while we waited
+        if time.monotonic() < _token_cache["expires_at"] - TOKEN_REFRESH_MARGIN_SECONDS:
+            return _token_cache["access_token"]
+        return await _fetch_spotify_token(client)
+
+async def _fetch_spotify_token(client: httpx.AsyncClient):
+    """Authenticates with Spotify and caches the new access token."""
     auth_url = "https://accounts.spotify.com/api/token"
     auth_data = {
         'grant_type': 'client_credentials',
         'client_id': SPOTIFY_CLIENT_ID,
         'client_secret': SPOTIFY_CLIENT_SECRET,
     }
-    async with httpx.AsyncClient() as client:
-        try:
-            auth_response = await client.post(auth_url, data=auth_data)
-            auth_response.raise_for_status()
-            return auth_response.json()['access_token']
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(status_code=502, detail=f"Spotify auth failed: {e}")
+    try:
+        auth_response = await client.post(auth_url, data=auth_data)
+        auth_response.raise_for_status()
+        token_info = auth_response.json()
+        _token_cache["access_token"] = token_info['access_token']
+        _token_cache["expires_at"] = time.monotonic() + token_info.get('expires_in', 3600)
+        return token_info['access_token']
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=502, detail=f"Spotify auth failed: {e}")
+
+# Searches in flight per batch request; roughly what Spotify tolerates per token
+MAX_CONCURRENT_SEARCHES = 10
+
+async def _search_artists(client: httpx.AsyncClient, token: str, artist_name: str):
+    """Runs one Spotify artist search and returns the matching artists, best first."""
+    headers = {'Authorization': f'Bearer {token}'}
+    search_url = "https://api.spotify.com/v1/search"
+    params = {'q': artist_name, 'type': 'artist', 'limit': 1}
+
+    search_response = await client.get(search_url, headers=headers, params=params)
+    if search_response.status_code == 401:
+        # Token revoked or expired early; fetch a fresh one next time
+        _token_cache["expires_at"] = 0.0
+    search_response.raise_for_status()
+
+    return search_response.json().get('artists', {}).get('items', [])
 
 @app.post("/search-artist")
-async def search_artist(search_request: ArtistSearchRequest):
+async def search_artist(search_request: ArtistSearchRequest, request: Request):
     """
     Endpoint to search for an artist on Spotify.
     Receives a JSON body with 'artist_name' and returns the first result.
     """
     try:
-        token = await get_spotify_token()
-        headers = {'Authorization': f'Bearer {token}'}
-        search_url = "https://api.spotify.com/v1/search"
-        params = {'q': search_request.artist_name, 'type': 'artist', 'limit': 1}
-
-        async with httpx.AsyncClient() as client:
-            search_response = await client.get(search_url, headers=headers, params=params)
-            search_response.raise_for_status()
-
-        search_results = search_response.json()
-        artists = search_results.get('artists', {}).get('items', [])
+        client = request.app.state.http
+        token = await get_spotify_token(client)
+        artists = await _search_artists(client, token, search_request.artist_name)
 
         if not artists:
             raise HTTPException(
@@ -64,4 +114,25 @@ async def search_artist(search_request: ArtistSearchRequest):
             detail=f"Error from Spotify API: {e.response.text}"
         )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
+@app.post("/search-artists-batch")
+async def search_artists_batch(search_request: ArtistBatchSearchRequest, request: Request):
+    """
+    Endpoint to search for several artists on Spotify concurrently.
+    Receives a JSON body with 'artist_names' and returns one entry per name, in order,
+    holding the first result or None if nothing was found or the search failed.
+    """
+    client = request.app.state.http
+    token = await get_spotify_token(client)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SEARCHES)
+
+    async def search_one(artist_name: str):
+        async with semaphore:
+            try:
+                artists = await _search_artists(client, token, artist_name)
+            except httpx.HTTPError:
+                return {"artist_name": artist_name, "artist": None, "error": "Spotify search failed"}
+        return {"artist_name": artist_name, "artist": artists[0] if artists else None}
+
+    return await asyncio.gather(*(search_one(name) for name in search_request.artist_names))